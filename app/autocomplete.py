@@ -0,0 +1,289 @@
+import asyncio
+import heapq
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.config import settings
+from app.export import UPDATED_AT_FIELD, utc_now
+from app.view_counter import VIEWS_FIELD
+
+# --- Índice de autocompletado en memoria ---
+# Vocabulario ordenado de términos (palabras del nombre, categoría y
+# etiquetas) con la lista de productos de cada uno: un prefijo se resuelve
+# con bisect sobre el vocabulario. Para tolerar errores de tipeo en palabras
+# cortas (un error) se buscan como prefijo todas las variantes a un error del
+# token; en las largas (dos errores) un índice de bigramas con su posición
+# propone términos parecidos que luego se verifican con la distancia de edición.
+
+SUGGEST_PROJECTION = {"name": 1, "category": 1, "tags": 1, "price": 1, "stock": 1, "image_url": 1, VIEWS_FIELD: 1}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789" # Lo que deja pasar _TOKEN_RE
+_MAX_FUZZY_TERMS = 200 # Términos candidatos que se verifican con la distancia de edición
+_GRAMS_LOST_PER_TYPO = 3 # Bigramas que puede romper un error (una transposición rompe 3)
+
+
+def normalize(text: str) -> str:
+    # Minúsculas y sin tildes: "Piña" y "pina" son el mismo término
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text)) if text else []
+
+
+def max_typos(token: str) -> int:
+    if len(token) < 4:
+        return 0
+    return 1 if len(token) < 8 else 2
+
+
+def _grams(term: str) -> Dict[str, int]:
+    # Bigrama -> primera posición. Anclado al inicio: se comparan prefijos
+    padded = "^" + term
+    grams: Dict[str, int] = {}
+    for i in range(len(padded) - 1):
+        grams.setdefault(padded[i:i + 2], i)
+    return grams
+
+
+def _variants(token: str) -> List[str]:
+    # Todo lo que está a un error del token, de lo más parecido a lo más amplio.
+    # Insertar al final no hace falta: ese prefijo ya coincide sin errores.
+    splits = [(token[:i], token[i:]) for i in range(len(token))]
+    variants = [head + tail[1] + tail[0] + tail[2:] for head, tail in splits if len(tail) > 1]
+    variants += [head + ch + tail[1:] for head, tail in splits for ch in _ALPHABET if ch != tail[0]]
+    variants += [head + ch + tail for head, tail in splits for ch in _ALPHABET]
+    variants += [head + tail[1:] for head, tail in splits]
+    return list(dict.fromkeys(variants))
+
+
+def _prefix_distance(token: str, term: str, limit: int) -> int:
+    # Damerau-Levenshtein restringida (una transposición cuenta como 1) entre el
+    # token y el prefijo más parecido del término, con corte en limit: el
+    # usuario aún está escribiendo. Una sola pasada da la distancia a todos los
+    # prefijos (la última fila de la matriz).
+    a, b = token, term[:len(token) + limit]
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[max(1, len(a) - limit):])
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._entries: Dict[str, dict] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._gram_terms: Dict[str, Dict[str, int]] = {} # Bigrama -> término -> posición
+        self._task: Optional[asyncio.Task] = None
+        self._refreshed_at = None
+        self._rebuilt_at = 0.0
+
+    # --- Mantenimiento ---
+
+    def upsert(self, doc: dict) -> None:
+        product_id = str(doc["_id"])
+        previous = self._entries.get(product_id)
+        terms = set(tokenize(doc.get("name"))) | set(tokenize(doc.get("category")))
+        for tag in doc.get("tags") or []:
+            terms.update(tokenize(tag))
+        entry = {
+            "_id": product_id,
+            "name": doc.get("name", previous["name"] if previous else ""),
+            "category": doc.get("category", previous["category"] if previous else ""),
+            "price": doc.get("price", previous["price"] if previous else 0),
+            "stock": doc.get("stock", previous["stock"] if previous else 0),
+            "image_url": doc.get("image_url", previous["image_url"] if previous else None),
+            "views": doc.get(VIEWS_FIELD, previous["views"] if previous else 0),
+            "terms": terms,
+        }
+        if previous:
+            for term in previous["terms"] - terms:
+                self._remove_posting(term, product_id)
+            terms = terms - previous["terms"]
+        for term in terms:
+            self._add_posting(term, product_id)
+        self._entries[product_id] = entry
+
+    def remove(self, product_id: str) -> None:
+        entry = self._entries.pop(product_id, None)
+        if entry:
+            for term in entry["terms"]:
+                self._remove_posting(term, product_id)
+
+    def adjust_stock(self, product_id: str, delta: int) -> None:
+        entry = self._entries.get(product_id)
+        if entry:
+            entry["stock"] += delta
+
+    def add_view(self, product_id: str) -> None:
+        entry = self._entries.get(product_id)
+        if entry:
+            entry["views"] += 1
+
+    def _add_posting(self, term: str, product_id: str) -> None:
+        products = self._postings.get(term)
+        if products is None:
+            products = self._postings[term] = set()
+            insort(self._vocabulary, term)
+            for gram, position in _grams(term).items():
+                self._gram_terms.setdefault(gram, {})[term] = position
+        products.add(product_id)
+
+    def _remove_posting(self, term: str, product_id: str) -> None:
+        products = self._postings.get(term)
+        if products is None:
+            return
+        products.discard(product_id)
+        if not products:
+            del self._postings[term]
+            del self._vocabulary[bisect_left(self._vocabulary, term)]
+            for gram in _grams(term):
+                terms = self._gram_terms.get(gram)
+                if terms is not None:
+                    terms.pop(term, None)
+                    if not terms:
+                        del self._gram_terms[gram]
+
+    # --- Consulta ---
+
+    def _prefix_terms(self, prefix: str) -> Iterable[str]:
+        vocabulary = self._vocabulary
+        position = bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            yield vocabulary[position]
+            position += 1
+
+    def _fuzzy_terms(self, token: str, limit: int) -> Iterable[str]:
+        if limit == 1:
+            # Exacto y acotado: unas 36 * 2 * len(token) búsquedas con bisect
+            for variant in _variants(token):
+                yield from self._prefix_terms(variant)
+            return
+        # Filtro por bigramas antes de la distancia de edición: con limit errores
+        # el prefijo buscado conserva casi todos los bigramas del token, cerca de
+        # la misma posición y en un término no mucho más corto
+        grams = _grams(token)
+        shared = Counter()
+        for gram, position in grams.items():
+            for term, term_position in self._gram_terms.get(gram, {}).items():
+                if term_position <= position + limit:
+                    shared[term] += 1
+        min_shared = max(1, len(grams) - _GRAMS_LOST_PER_TYPO * limit)
+        min_length = len(token) - limit
+        candidates = [
+            (count, term) for term, count in shared.items()
+            if count >= min_shared and len(term) >= min_length
+        ]
+        for _, term in heapq.nlargest(_MAX_FUZZY_TERMS, candidates):
+            if _prefix_distance(token, term, limit) <= limit:
+                yield term
+
+    def _matches(self, token: str, fuzzy: bool) -> Set[str]:
+        products: Set[str] = set()
+        terms = self._fuzzy_terms(token, max_typos(token)) if fuzzy else self._prefix_terms(token)
+        for term in terms:
+            products |= self._postings[term]
+            if len(products) >= settings.SUGGEST_MAX_CANDIDATES:
+                break
+        return products
+
+    def _candidates(self, tokens: List[str], fuzzy: bool) -> Set[str]:
+        # Todas las palabras de la consulta deben coincidir (como prefijo)
+        candidates: Optional[Set[str]] = None
+        for token in sorted(tokens, key=len, reverse=True): # La más larga suele ser la más selectiva
+            matched = self._matches(token, fuzzy and max_typos(token) > 0)
+            if fuzzy and not matched:
+                matched = self._matches(token, False)
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return set()
+        return candidates or set()
+
+    def suggest(self, query: str, limit: int) -> List[dict]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        ranked = self._rank(self._candidates(tokens, fuzzy=False), limit)
+        if len(ranked) < limit and any(max_typos(token) for token in tokens):
+            # Pocas coincidencias exactas: completar con las tolerantes a errores
+            seen = {entry["_id"] for entry in ranked}
+            ranked += self._rank(self._candidates(tokens, fuzzy=True) - seen, limit - len(ranked))
+        return [{key: value for key, value in entry.items() if key not in ("terms", "views")} for entry in ranked]
+
+    def _rank(self, product_ids: Set[str], limit: int) -> List[dict]:
+        # Primero lo que hay en stock, luego lo más visto y lo de más stock
+        return heapq.nlargest(
+            limit,
+            (self._entries[pid] for pid in product_ids),
+            key=lambda entry: (entry["stock"] > 0, entry["views"], entry["stock"]),
+        )
+
+    # --- Carga desde Mongo ---
+
+    async def rebuild(self, collection: AsyncIOMotorCollection) -> int:
+        started_at = utc_now()
+        fresh = SuggestIndex()
+        async for doc in collection.find({}, SUGGEST_PROJECTION).batch_size(settings.EXPORT_BATCH_SIZE):
+            fresh.upsert(doc)
+        self._entries, self._postings = fresh._entries, fresh._postings
+        self._vocabulary, self._gram_terms = fresh._vocabulary, fresh._gram_terms
+        self._refreshed_at = started_at
+        self._rebuilt_at = time.monotonic()
+        return len(self._entries)
+
+    async def refresh(self, collection: AsyncIOMotorCollection) -> int:
+        # Cambios hechos por otros workers: todo lo escrito desde la última pasada
+        started_at = utc_now()
+        query = {UPDATED_AT_FIELD: {"$gte": self._refreshed_at}} if self._refreshed_at else {}
+        updated = 0
+        async for doc in collection.find(query, SUGGEST_PROJECTION):
+            self.upsert(doc)
+            updated += 1
+        self._refreshed_at = started_at
+        return updated
+
+    def start(self, collection: AsyncIOMotorCollection) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(collection))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, collection: AsyncIOMotorCollection) -> None:
+        while True:
+            await asyncio.sleep(settings.SUGGEST_REFRESH_SECONDS)
+            try:
+                if time.monotonic() - self._rebuilt_at >= settings.SUGGEST_REBUILD_SECONDS:
+                    await self.rebuild(collection) # También elimina lo borrado por otros workers
+                else:
+                    await self.refresh(collection)
+            except Exception as e:
+                print(f"Error al actualizar el índice de autocompletado: {e}")
+
+    def stats(self) -> dict:
+        return {"products": len(self._entries), "terms": len(self._vocabulary)}
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+# --- Agrupación de búsquedas por clave (estilo DataLoader) ---
+# Las claves pedidas dentro de una ventana corta se resuelven con una sola
+# llamada a load_fn, y quien pide una clave que ya está en vuelo espera ese
+# mismo resultado en lugar de lanzar otra consulta idéntica. load_fn corre en
+# un contexto limpio: no hereda el plazo (pymongo.timeout) de quien abrió el
+# lote, así que debe poner el suyo. Cada petición acota solo su propia espera.
+
+LoadFn = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+
+class BatchLoader:
+    def __init__(self, load_fn: LoadFn, window_seconds: float, max_batch: int):
+        self.load_fn = load_fn
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._pending: List[Hashable] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"requested": 0, "coalesced": 0, "batches": 0, "loaded": 0}
+
+    async def load_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Devuelve {clave: valor}; las claves que load_fn no encuentra quedan en None."""
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for key in keys:
+            if key in futures:
+                continue
+            self._stats["requested"] += 1
+            future = self._inflight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._inflight[key] = future
+                self._pending.append(key)
+            else:
+                self._stats["coalesced"] += 1
+            futures[key] = future
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._dispatch)
+        # shield: si una petición se cancela, las demás que esperan la misma clave siguen
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return dict(zip(futures, results))
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        keys, self._pending = self._pending, []
+        for start in range(0, len(keys), self.max_batch):
+            task = asyncio.get_running_loop().create_task(
+                self._load(keys[start:start + self.max_batch]), context=contextvars.Context()
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, keys: List[Hashable]) -> None:
+        self._stats["batches"] += 1
+        self._stats["loaded"] += len(keys)
+        try:
+            found = await self.load_fn(keys)
+        except Exception as e:
+            for key in keys:
+                future = self._inflight.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key in keys:
+            future = self._inflight.pop(key)
+            if not future.done():
+                future.set_result(found.get(key))
+
+    def stats(self) -> dict:
+        return {**self._stats, "in_flight": len(self._inflight)}
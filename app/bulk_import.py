@@ -0,0 +1,181 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from app.config import settings
+from app.export import UPDATED_AT_FIELD, utc_now
+from app.models import ProductCreate
+from app.view_counter import VIEWS_FIELD
+
+# --- Importación masiva de productos ---
+# El cuerpo se lee por trozos y se procesa fila a fila; solo se mantiene en
+# memoria un lote de documentos y una lista acotada de errores, así que el
+# consumo no depende del tamaño del archivo.
+
+CSV_LIST_SEPARATOR = "|" # Separador de tags dentro de una celda CSV
+OVERSIZED_LINE = None # Lo que produce iter_lines en lugar de una línea demasiado larga
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Optional[str]]:
+    # Sin salto de línea el resto pendiente crecería sin límite: pasado el máximo
+    # se descarta hasta el siguiente salto y se entrega OVERSIZED_LINE
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    oversized = False
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if oversized or len(line) > settings.BULK_IMPORT_MAX_LINE_CHARS:
+                oversized = False
+                yield OVERSIZED_LINE
+            else:
+                yield line.rstrip("\r")
+        if len(pending) > settings.BULK_IMPORT_MAX_LINE_CHARS:
+            pending, oversized = "", True
+    pending += decoder.decode(b"", final=True)
+    if oversized or len(pending) > settings.BULK_IMPORT_MAX_LINE_CHARS:
+        yield OVERSIZED_LINE
+    elif pending:
+        yield pending.rstrip("\r")
+
+
+def _oversized_error() -> ValueError:
+    return ValueError(f"Línea de más de {settings.BULK_IMPORT_MAX_LINE_CHARS} caracteres")
+
+
+async def iter_ndjson_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    row_number = 0
+    async for line in iter_lines(stream):
+        if line is OVERSIZED_LINE:
+            row_number += 1
+            yield row_number, _oversized_error()
+            continue
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, ValueError(f"JSON inválido: {e.msg}")
+
+
+def _csv_row_to_dict(header: list, values: list) -> dict:
+    row = {}
+    for field, value in zip(header, values):
+        if value == "":
+            continue # Campos vacíos = no enviados (usan el valor por defecto)
+        if field == "tags":
+            row[field] = [tag.strip() for tag in value.split(CSV_LIST_SEPARATOR) if tag.strip()]
+        else:
+            row[field] = value
+    return row
+
+
+def _header_error() -> HTTPException:
+    # Sin cabecera no se sabe a qué campo va cada columna: se aborta la importación
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Cabecera CSV ilegible: más de {settings.BULK_IMPORT_MAX_LINE_CHARS} caracteres o comillas sin cerrar",
+    )
+
+
+async def iter_csv_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    header = None
+    row_number = 0
+    buffered = ""
+    async for line in iter_lines(stream):
+        if len(buffered) > settings.BULK_IMPORT_MAX_LINE_CHARS:
+            # Registro entre comillas que nunca se cierra: se descarta y la línea
+            # actual empieza el siguiente
+            buffered = ""
+            if header is None:
+                raise _header_error()
+            row_number += 1
+            yield row_number, _oversized_error()
+        if line is OVERSIZED_LINE:
+            buffered = ""
+            if header is None:
+                raise _header_error()
+            row_number += 1
+            yield row_number, _oversized_error()
+            continue
+        # Un campo entre comillas puede contener saltos de línea: seguir
+        # acumulando mientras el número de comillas sea impar
+        buffered = f"{buffered}\n{line}" if buffered else line
+        if buffered.count('"') % 2 == 1:
+            continue
+        record, buffered = buffered, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row_number += 1
+        if len(values) > len(header):
+            yield row_number, ValueError("La fila tiene más columnas que la cabecera")
+        else:
+            yield row_number, _csv_row_to_dict(header, values)
+    if buffered:
+        if header is None:
+            raise _header_error()
+        yield row_number + 1, ValueError("Comillas sin cerrar al final del archivo")
+
+
+async def import_products(
+    collection, rows: AsyncIterator[Tuple[int, object]], on_inserted: Optional[Callable[[dict], None]] = None
+) -> dict:
+    # on_inserted recibe cada documento que quedó escrito (con su _id)
+    summary = {"received": 0, "inserted": 0, "failed": 0, "errors": []}
+
+    def add_error(row_number: int, detail) -> None:
+        summary["failed"] += 1
+        if len(summary["errors"]) < settings.BULK_IMPORT_MAX_ERRORS:
+            summary["errors"].append({"row": row_number, "detail": detail})
+
+    async def flush(batch: list, batch_rows: list) -> None:
+        try:
+            result = await collection.insert_many(batch, ordered=False)
+            summary["inserted"] += len(result.inserted_ids)
+            failed = set()
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            summary["inserted"] += e.details.get("nInserted", len(batch) - len(write_errors))
+            for error in write_errors:
+                add_error(batch_rows[error["index"]], error.get("errmsg", "Error de escritura"))
+            failed = {error["index"] for error in write_errors}
+        if on_inserted is not None:
+            for index, doc in enumerate(batch):
+                if index not in failed:
+                    on_inserted(doc)
+
+    batch, batch_rows = [], []
+    async for row_number, row in rows:
+        summary["received"] += 1
+        if isinstance(row, Exception):
+            add_error(row_number, str(row))
+            continue
+        if not isinstance(row, dict):
+            add_error(row_number, "Cada fila debe ser un objeto")
+            continue
+        try:
+            product = ProductCreate.model_validate(row)
+        except ValidationError as e:
+            add_error(row_number, e.errors(include_url=False, include_context=False, include_input=False))
+            continue
+        batch.append({**product.model_dump(exclude_none=True), VIEWS_FIELD: 0, UPDATED_AT_FIELD: utc_now()})
+        batch_rows.append(row_number)
+        if len(batch) >= settings.BULK_IMPORT_BATCH_SIZE:
+            await flush(batch, batch_rows)
+            batch, batch_rows = [], []
+    if batch:
+        await flush(batch, batch_rows)
+
+    summary["errors_truncated"] = summary["failed"] > len(summary["errors"])
+    return summary
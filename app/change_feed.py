@@ -0,0 +1,230 @@
+import asyncio
+from collections import deque
+from typing import Deque, List, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.config import settings
+from app.metrics import Counter, Gauge
+from app.serialization import json_bytes, product_public
+
+# --- Feed de cambios de productos (Server-Sent Events) ---
+# Un único change stream de Mongo por proceso alimenta a todos los clientes
+# conectados: cada evento se serializa una vez y se reparte a las colas de
+# los suscriptores que coinciden con su filtro.
+
+sse_subscribers = Gauge("sse_subscribers", "Clientes conectados al feed de cambios de productos")
+change_feed_events_total = Counter("change_feed_events_total", "Eventos del change stream de productos", ("op",))
+sse_dropped_subscribers_total = Counter(
+    "sse_dropped_subscribers_total", "Suscriptores desconectados por no consumir eventos a tiempo"
+)
+
+# Códigos de Mongo: servidor sin replica set y token de reanudación expirado del oplog
+_CHANGE_STREAMS_UNSUPPORTED = 40573
+_HISTORY_LOST = (286, 280)
+
+RESET_FRAME = b"event: reset\ndata: {}\n\n" # El cliente debe recargar el catálogo completo
+
+# Campos internos del producto: visitas (flush periódico), marcas de ajustes de
+# stock, metadatos de la imagen (miniaturas) y fecha de escritura. Una
+# actualización que solo toca estos no cambia nada de lo que ve el cliente.
+INTERNAL_FIELDS = ["views", "_stock_ops", "_image", "updated_at"]
+
+
+def _touches_public_fields(paths) -> dict:
+    # ¿Queda algún campo raíz ("campo" de "campo.sub") que no sea interno?
+    roots = {"$map": {"input": paths, "in": {"$arrayElemAt": [{"$split": ["$$this", "."]}, 0]}}}
+    return {"$gt": [{"$size": {"$setDifference": [roots, INTERNAL_FIELDS]}}, 0]}
+
+
+# Se filtra en el servidor, antes del updateLookup: el flush de visitas actualiza
+# muchos productos cada pocos segundos y no debe inundar el feed
+CHANGE_STREAM_PIPELINE = [{"$match": {"$expr": {"$or": [
+    {"$ne": ["$operationType", "update"]},
+    _touches_public_fields({"$map": {
+        "input": {"$objectToArray": {"$ifNull": ["$updateDescription.updatedFields", {}]}}, "in": "$$this.k",
+    }}),
+    _touches_public_fields({"$ifNull": ["$updateDescription.removedFields", []]}),
+]}}}]
+
+
+# Campos que usan los filtros de suscripción
+FILTER_FIELDS = ("category", "tags")
+
+
+def _frame(event_id: str, op: str, data: dict) -> bytes:
+    return b"id: " + event_id.encode() + b"\nevent: " + op.encode() + b"\ndata: " + json_bytes(data) + b"\n\n"
+
+
+class FeedEvent:
+    __slots__ = ("event_id", "op", "product", "frame", "leave_frame")
+
+    def __init__(self, event_id: str, op: str, product_id: str, product: Optional[dict], filter_changed: bool = False):
+        self.event_id = event_id
+        self.op = op
+        self.product = product
+        self.frame = _frame(event_id, op, {"op": op, "id": product_id, "product": product})
+        # Si cambió la categoría o las etiquetas, quien filtra y ya no coincide
+        # recibe "leave" para quitar el producto de su vista
+        self.leave_frame = _frame(event_id, "leave", {"op": "leave", "id": product_id, "product": None}) \
+            if filter_changed else None
+
+
+class Subscription:
+    def __init__(self, category: Optional[str], tags: Optional[List[str]], maxsize: int):
+        self.category = category
+        self.tags = set(tags or ())
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def matches(self, event: FeedEvent) -> bool:
+        # Los borrados no traen el documento: se envían a todos
+        if event.product is None:
+            return True
+        if self.category and event.product.get("category") != self.category:
+            return False
+        if self.tags and not self.tags.intersection(event.product.get("tags") or ()):
+            return False
+        return True
+
+    def frame_for(self, event: FeedEvent) -> Optional[bytes]:
+        if self.matches(event):
+            return event.frame
+        # Sin la versión anterior del documento no se sabe si antes coincidía:
+        # el cliente ignora el "leave" de un producto que no tenía
+        if event.leave_frame is not None and (self.category or self.tags):
+            return event.leave_frame
+        return None
+
+
+class ProductChangeFeed:
+    def __init__(self, replay_size: int, queue_size: int):
+        self.queue_size = queue_size
+        self.available = True
+        self._subscribers: Set[Subscription] = set()
+        # Últimos eventos, para que un cliente que reconecta con Last-Event-ID no pierda nada
+        self._recent: Deque[FeedEvent] = deque(maxlen=replay_size)
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, collection: AsyncIOMotorCollection) -> None:
+        if self.available and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._watch(collection))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._close_all()
+
+    def subscribe(self, category: Optional[str], tags: Optional[List[str]],
+                  last_event_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(category, tags, self.queue_size)
+        if last_event_id:
+            self._replay(sub, last_event_id)
+        self._subscribers.add(sub)
+        sse_subscribers.set(len(self._subscribers))
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscribers.discard(sub)
+        sse_subscribers.set(len(self._subscribers))
+
+    def _replay(self, sub: Subscription, last_event_id: str) -> None:
+        ids = [event.event_id for event in self._recent]
+        if last_event_id not in ids:
+            # El evento ya salió del buffer (o es de otro proceso): no se puede garantizar continuidad
+            sub.queue.put_nowait(RESET_FRAME)
+            return
+        frames = (sub.frame_for(e) for e in list(self._recent)[ids.index(last_event_id) + 1:])
+        pending = [frame for frame in frames if frame is not None]
+        if len(pending) >= sub.queue.maxsize:
+            sub.queue.put_nowait(RESET_FRAME)
+            return
+        for frame in pending:
+            sub.queue.put_nowait(frame)
+
+    def _broadcast(self, frame: Optional[bytes], event: Optional[FeedEvent] = None) -> None:
+        for sub in list(self._subscribers):
+            sub_frame = frame if event is None else sub.frame_for(event)
+            if sub_frame is None:
+                continue
+            try:
+                sub.queue.put_nowait(sub_frame)
+            except asyncio.QueueFull:
+                # Cliente lento: se le cierra la conexión y reconecta con Last-Event-ID
+                self.unsubscribe(sub)
+                sse_dropped_subscribers_total.inc()
+                sub.queue.get_nowait()
+                sub.queue.put_nowait(None)
+
+    def _close_all(self) -> None:
+        for sub in list(self._subscribers):
+            self.unsubscribe(sub)
+            try:
+                sub.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                sub.queue.get_nowait()
+                sub.queue.put_nowait(None)
+
+    def publish(self, change: dict) -> None:
+        op = change["operationType"]
+        if op not in ("insert", "update", "replace", "delete"):
+            return
+        full_document = change.get("fullDocument")
+        if op == "update":
+            description = change.get("updateDescription") or {}
+            paths = [*(description.get("updatedFields") or {}), *(description.get("removedFields") or ())]
+            filter_changed = any(path.split(".")[0] in FILTER_FIELDS for path in paths)
+        else:
+            filter_changed = op == "replace"
+        event = FeedEvent(
+            change["_id"]["_data"],
+            "delete" if full_document is None else op,
+            str(change["documentKey"]["_id"]),
+            product_public(full_document) if full_document is not None else None,
+            filter_changed,
+        )
+        change_feed_events_total.inc(event.op)
+        self._recent.append(event)
+        self._broadcast(event.frame, event)
+
+    async def _watch(self, collection: AsyncIOMotorCollection) -> None:
+        delay = 0.5
+        while True:
+            try:
+                async with collection.watch(
+                    CHANGE_STREAM_PIPELINE, full_document="updateLookup", resume_after=self._resume_token
+                ) as stream:
+                    delay = 0.5
+                    async for change in stream:
+                        self._resume_token = change["_id"]
+                        if change["operationType"] == "invalidate":
+                            self._resume_token = None
+                            break
+                        self.publish(change)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == _CHANGE_STREAMS_UNSUPPORTED:
+                    print("Change streams no disponibles (MongoDB sin replica set): feed de productos desactivado")
+                    self.available = False
+                    self._close_all()
+                    return
+                if e.code in _HISTORY_LOST:
+                    # El oplog ya no tiene el punto de reanudación: los clientes deben recargar
+                    self._resume_token = None
+                    self._recent.clear()
+                    self._broadcast(RESET_FRAME)
+                print(f"Error en el change stream de productos: {e}")
+            except PyMongoError as e:
+                print(f"Error en el change stream de productos: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+product_feed = ProductChangeFeed(settings.CHANGE_FEED_REPLAY_SIZE, settings.SSE_SUBSCRIBER_QUEUE_SIZE)
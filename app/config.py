@@ -1,5 +1,9 @@
+from pydantic import PositiveFloat
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Dict, Literal, Optional
+
+ReadPreferenceName = Literal["primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"]
 
 class Settings(BaseSettings):
     PROJECT_NAME: str
@@ -9,6 +13,123 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
 
+    # Cliente de MongoDB
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = None
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_CONNECT_TIMEOUT_MS: int = 10000
+    MONGO_SOCKET_TIMEOUT_MS: Optional[int] = None
+    MONGO_COMPRESSORS: str = "" # Ej. "zstd,snappy,zlib"; se ignoran los no instalados
+    # Lecturas del catálogo; auth, usuarios y escrituras siempre van al primario
+    MONGO_PRODUCT_READ_PREFERENCE: ReadPreferenceName = "primary"
+
+    # Servidor de producción (python -m app.server)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: Optional[int] = None # Por defecto, uno por CPU
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    WARMUP_PRODUCT_CACHE: int = 200 # Productos que se precargan en la caché al arrancar
+
+    # Paginación de listados
+    DEFAULT_PAGE_SIZE: int = 20
+    MAX_PAGE_SIZE: int = 100
+
+    # Pool de hashing de contraseñas
+    HASH_POOL_WORKERS: int = 4
+    HASH_QUEUE_MAX: int = 64
+    # Esquema y coste del hash (calibrar con python -m app.hash_calibration). Los
+    # hashes con otro esquema o coste se siguen aceptando y se rehacen en el login.
+    PASSWORD_HASH_SCHEME: Literal["bcrypt", "argon2"] = "bcrypt" # argon2 requiere argon2-cffi
+    BCRYPT_ROUNDS: int = 12 # Cada ronda más duplica el tiempo (4 a 31)
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST_KIB: int = 65536
+    ARGON2_PARALLELISM: int = 4
+
+    # Límite de intentos de login y registro (token bucket). Las tasas deben ser
+    # mayores que 0: para desactivar el límite se usa RATE_LIMIT_ENABLED
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    LOGIN_RATE_PER_IP_PER_MINUTE: PositiveFloat = 30
+    LOGIN_BURST_PER_IP: int = 10
+    LOGIN_RATE_PER_EMAIL_PER_MINUTE: PositiveFloat = 5
+    LOGIN_BURST_PER_EMAIL: int = 5
+    SIGNUP_RATE_PER_IP_PER_MINUTE: PositiveFloat = 5
+    SIGNUP_BURST_PER_IP: int = 5
+    SIGNUP_RATE_PER_EMAIL_PER_MINUTE: PositiveFloat = 2 # Un email solo se registra una vez: el resto son sondeos
+    SIGNUP_BURST_PER_EMAIL: int = 3
+
+    # Caché del usuario autenticado
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL_SECONDS: float = 30
+
+    # Caché de productos individuales
+    PRODUCT_CACHE_SIZE: int = 2048
+    PRODUCT_CACHE_TTL_SECONDS: float = 60
+
+    # Caché de facetas del catálogo (por combinación de filtros)
+    FACET_CACHE_SIZE: int = 256
+    FACET_CACHE_TTL_SECONDS: float = 60 # Los ajustes de stock no la invalidan: los conteos con in_stock tardan esto
+
+    # Plazos por petición (ms; 0 = sin plazo) y control de admisión
+    REQUEST_DEADLINE_MS: int = 10_000
+    REQUEST_DEADLINE_MAX_MS: int = 60_000 # Máximo que puede pedir un cliente con X-Request-Deadline-Ms
+    REQUEST_DEADLINE_ROUTES_MS: Dict[str, int] = { # Por nombre de la función de la ruta
+        "stream_product_changes": 0,
+        "export_products": 0,
+        "bulk_import_products": 0, # Los lotes ya escritos no se deshacen: cortar a mitad perdería el resumen
+        "upload_product_image": 60_000,
+    }
+    ADMISSION_MAX_IN_FLIGHT: int = 1000 # 0 = sin límite
+    ADMISSION_MAX_MONGO_WAITERS: int = 500 # Operaciones esperando conexión del pool; 0 = sin límite
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # Observabilidad
+    MONGO_SLOW_COMMAND_MS: int = 100
+
+    # Importación masiva de productos
+    BULK_IMPORT_BATCH_SIZE: int = 1000
+    BULK_IMPORT_MAX_ERRORS: int = 1000
+    BULK_IMPORT_MAX_LINE_CHARS: int = 64 * 1024 # Una línea (o registro CSV) más larga es un error de esa fila
+
+    # Imágenes de productos (GridFS)
+    PRODUCT_IMAGE_MAX_BYTES: int = 5 * 1024 * 1024
+    PRODUCT_THUMBNAIL_SIZES: str = "160,480" # Lados máximos en píxeles, separados por coma
+    IMAGE_POOL_WORKERS: int = 2
+
+    # Lecturas de productos por lotes
+    PRODUCT_BATCH_MAX_IDS: int = 100
+    PRODUCT_LOADER_WINDOW_MS: float = 1.0 # Ventana para agrupar búsquedas concurrentes en una consulta
+    PRODUCT_LOADER_MAX_BATCH: int = 200
+
+    # Exportación del catálogo
+    EXPORT_BATCH_SIZE: int = 1000 # Documentos por lote del cursor
+    EXPORT_SNAPSHOT_LAG_SECONDS: float = 5
+
+    # Contadores de visitas (escritura diferida)
+    VIEW_FLUSH_INTERVAL_SECONDS: float = 10
+    VIEW_FLUSH_THRESHOLD: int = 5000 # Visitas pendientes que fuerzan un flush anticipado
+
+    # Feed de cambios de productos (SSE)
+    CHANGE_FEED_REPLAY_SIZE: int = 1000 # Eventos recientes que se reenvían a quien reconecta
+    SSE_SUBSCRIBER_QUEUE_SIZE: int = 256 # Eventos pendientes por cliente antes de desconectarlo
+    SSE_KEEPALIVE_SECONDS: float = 15
+
+    # Autocompletado de productos (índice en memoria)
+    SUGGEST_REFRESH_SECONDS: float = 30 # Cada cuánto se traen los cambios hechos por otros workers
+    SUGGEST_REBUILD_SECONDS: float = 900 # Reconstrucción completa (recoge también los borrados)
+    SUGGEST_MAX_CANDIDATES: int = 5000 # Productos por palabra que se consideran al ordenar
+    SUGGEST_CACHE_SIZE: int = 1024
+    SUGGEST_CACHE_TTL_SECONDS: float = 10
+
+    # Perfilado de peticiones (cabecera X-Profile de superusuario o muestreo)
+    PROFILING_ENABLED: bool = True # False: el middleware ni se instala
+    PROFILE_SAMPLE_RATE: float = 0.0 # Fracción de peticiones perfiladas al azar; 0 = solo con la cabecera
+    PROFILE_SAMPLE_INTERVAL_MS: float = 1.0
+    PROFILE_BUFFER_SIZE: int = 50 # Perfiles recientes que se guardan por proceso
+    PROFILE_MAX_CONCURRENT: int = 2 # Cada perfil activo usa un hilo de muestreo
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', extra='ignore')
 
 @lru_cache()
@@ -0,0 +1,62 @@
+from importlib.util import find_spec
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReadPreference
+
+from app.config import settings
+from app.metrics import mongo_event_listeners
+
+# --- Fábrica del cliente de MongoDB ---
+# Reúne en un solo sitio el tamaño del pool, los timeouts, la compresión y
+# las preferencias de lectura configurables desde Settings.
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Compresores de red y el paquete opcional que necesita cada uno
+_COMPRESSOR_PACKAGES = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+
+
+def available_compressors(requested: str) -> list:
+    compressors = []
+    for name in (c.strip() for c in requested.split(",")):
+        if not name:
+            continue
+        if name not in _COMPRESSOR_PACKAGES:
+            print(f"Compresor de MongoDB desconocido, se ignora: {name}")
+            continue
+        package = _COMPRESSOR_PACKAGES[name]
+        if package and find_spec(package) is None:
+            print(f"Compresor '{name}' no disponible (falta el paquete '{package}'), se ignora")
+            continue
+        compressors.append(name)
+    return compressors
+
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "event_listeners": mongo_event_listeners(),
+    }
+    if settings.MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if settings.MONGO_SOCKET_TIMEOUT_MS is not None:
+        options["socketTimeoutMS"] = settings.MONGO_SOCKET_TIMEOUT_MS
+    compressors = available_compressors(settings.MONGO_COMPRESSORS)
+    if compressors:
+        options["compressors"] = compressors
+    return AsyncIOMotorClient(settings.MONGO_URI, **options)
+
+
+def with_read_preference(db: AsyncIOMotorDatabase, mode: str) -> AsyncIOMotorDatabase:
+    if mode == "primary":
+        return db
+    return db.with_options(read_preference=READ_PREFERENCES[mode])
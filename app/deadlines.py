@@ -0,0 +1,159 @@
+import asyncio
+from typing import Optional
+
+import pymongo
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pymongo.errors import PyMongoError
+
+from app.config import settings
+from app.metrics import Counter, mongo_pool_wait_queue
+
+# --- Plazos por petición y control de admisión ---
+# Cada ruta tiene un plazo (REQUEST_DEADLINE_MS o el de REQUEST_DEADLINE_ROUTES_MS)
+# que el cliente puede ajustar con la cabecera X-Request-Deadline-Ms. Dentro
+# del plazo, pymongo.timeout() envía a Mongo el tiempo restante como maxTimeMS
+# y acota la espera por una conexión del pool. Si el cliente se desconecta,
+# la petición se cancela junto con sus consultas pendientes.
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+CLIENT_CLOSED_REQUEST = 499 # Convención de nginx: el cliente cerró la conexión
+
+# Rutas que siempre se atienden: observabilidad y conexiones SSE de larga duración
+ADMISSION_EXEMPT_PATHS = ("/api/v1/healthcheck", "/api/v1/metrics", "/api/v1/products/stream")
+
+request_deadline_exceeded_total = Counter(
+    "request_deadline_exceeded_total", "Peticiones que superaron su plazo", ("route",)
+)
+requests_cancelled_total = Counter(
+    "requests_cancelled_total", "Peticiones canceladas porque el cliente se desconectó", ("route",)
+)
+requests_shed_total = Counter("requests_shed_total", "Peticiones rechazadas por sobrecarga", ("reason",))
+
+
+def request_budget(request: Request, route_name: str) -> Optional[float]:
+    """Segundos de plazo de la petición, o None si la ruta no tiene plazo."""
+    budget_ms = settings.REQUEST_DEADLINE_ROUTES_MS.get(route_name, settings.REQUEST_DEADLINE_MS)
+    if budget_ms <= 0:
+        return None
+    header = request.headers.get(DEADLINE_HEADER)
+    if header is not None:
+        try:
+            requested = int(header)
+        except ValueError:
+            requested = 0
+        if requested <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Cabecera {DEADLINE_HEADER} inválida")
+        budget_ms = min(requested, settings.REQUEST_DEADLINE_MAX_MS)
+    return budget_ms / 1000
+
+
+class _DisconnectWatcher:
+    """
+    Lee los mensajes ASGI en segundo plano, de uno en uno, para enterarse de
+    la desconexión del cliente mientras la ruta trabaja. La cola de tamaño 1
+    mantiene el streaming del cuerpo: nunca se adelanta más de un trozo.
+    """
+
+    def __init__(self, receive, on_disconnect):
+        self._receive = receive
+        self._on_disconnect = on_disconnect
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._task = asyncio.create_task(self._pump())
+
+    async def _pump(self) -> None:
+        while True:
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                self._on_disconnect()
+                return
+            await self._queue.put(message)
+
+    async def receive(self) -> dict:
+        if self._task.done() and self._queue.empty():
+            return {"type": "http.disconnect"}
+        return await self._queue.get()
+
+    def close(self) -> None:
+        self._task.cancel()
+
+
+class DeadlineRoute(APIRoute):
+    """Clase de ruta para los routers de la API: aplica plazo, maxTimeMS y cancelación."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route_name = self.name
+
+        async def deadline_handler(request: Request) -> Response:
+            budget = request_budget(request, route_name)
+            task = asyncio.current_task()
+            disconnected = False
+
+            def on_disconnect():
+                nonlocal disconnected
+                disconnected = True
+                task.cancel()
+
+            watcher = _DisconnectWatcher(request.receive, on_disconnect)
+            try:
+                with pymongo.timeout(budget):
+                    async with asyncio.timeout(budget):
+                        return await handler(Request(request.scope, watcher.receive))
+            except TimeoutError:
+                request_deadline_exceeded_total.inc(route_name)
+                raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="La petición superó su tiempo límite")
+            except PyMongoError as e:
+                if not e.timeout:
+                    raise
+                request_deadline_exceeded_total.inc(route_name)
+                raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="La petición superó su tiempo límite")
+            except asyncio.CancelledError:
+                if not disconnected:
+                    raise
+                task.uncancel()
+                requests_cancelled_total.inc(route_name)
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+            finally:
+                watcher.close()
+
+        return deadline_handler
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI: con demasiadas peticiones en curso o demasiadas esperando
+    conexión en el pool de Mongo, responde 503 al instante en lugar de encolar.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+
+    def _overloaded(self) -> Optional[str]:
+        if settings.ADMISSION_MAX_IN_FLIGHT and self.in_flight >= settings.ADMISSION_MAX_IN_FLIGHT:
+            return "in_flight"
+        if settings.ADMISSION_MAX_MONGO_WAITERS and mongo_pool_wait_queue() >= settings.ADMISSION_MAX_MONGO_WAITERS:
+            return "mongo_pool"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in ADMISSION_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        reason = self._overloaded()
+        if reason:
+            requests_shed_total.inc(reason)
+            response = JSONResponse(
+                {"detail": "Servicio saturado, intenta de nuevo en unos segundos"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -6,13 +6,21 @@ from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorClient # Aseg
 from bson import ObjectId # Asegúrate que ObjectId está importado
 from typing import Optional # Asegúrate que Optional está importado
 
+from app.cache import TTLCache
 from app.config import settings
+from app.metrics import register_cache
 from app.models import UserInDB, TokenData
 from app.security import decode_access_token
 
 # --- Global DB client and instance (set by main.py lifespan) ---
 mongo_client: Optional[AsyncIOMotorClient] = None
 database_instance: Optional[AsyncIOMotorDatabase] = None
+# Misma base con la preferencia de lectura del catálogo (p. ej. secondaryPreferred)
+product_read_database: Optional[AsyncIOMotorDatabase] = None
+
+# Caché de usuarios autenticados por id (evita un find_one por petición)
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+register_cache("user", user_cache)
 
 
 # VVVVVV ESTA ES LA FUNCIÓN IMPORTANTE VVVVVV
@@ -24,6 +32,13 @@ async def get_db() -> AsyncIOMotorDatabase:
 # ^^^^^^ ASEGÚRATE QUE ESTA FUNCIÓN ESTÁ EXACTAMENTE ASÍ ^^^^^^
 
 
+async def get_product_read_db() -> AsyncIOMotorDatabase:
+    # Solo para lecturas de productos: pueden ir a secundarios
+    if product_read_database is None:
+        return await get_db()
+    return product_read_database
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 async def get_current_user(
@@ -46,11 +61,17 @@ async def get_current_user(
     if not ObjectId.is_valid(user_id): # Necesitas importar ObjectId de bson
         raise credentials_exception 
 
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
+
     user_doc = await db.users.find_one({"_id": ObjectId(user_id)}) # Y usarlo aquí
     if user_doc is None:
         raise credentials_exception
     
-    return UserInDB(**user_doc)
+    user = UserInDB(**user_doc)
+    user_cache.set(user_id, user)
+    return user
 
 async def get_current_active_user(
     current_user: UserInDB = Depends(get_current_user)
@@ -59,6 +80,14 @@ async def get_current_active_user(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuario inactivo")
     return current_user
 
+async def is_superuser_token(token: str) -> bool:
+    # Para middlewares, fuera del sistema de dependencias de FastAPI
+    try:
+        user = await get_current_user(await get_db(), token)
+    except HTTPException:
+        return False
+    return user.is_active and user.is_superuser
+
 async def get_current_active_superuser(
     current_user: UserInDB = Depends(get_current_active_user),
 ) -> UserInDB:
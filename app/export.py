@@ -0,0 +1,120 @@
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCursor, AsyncIOMotorDatabase
+from pydantic_core import to_json
+
+from app.config import settings
+from app.serialization import PRODUCT_FIELDS, public_doc
+from app.view_counter import VIEWS_FIELD
+
+# --- Exportación del catálogo en streaming ---
+# Se recorre un cursor de Mongo por lotes y cada fila se codifica (y
+# comprime) al vuelo. El generador solo avanza cuando el servidor pudo
+# enviar el trozo anterior, así que un cliente lento frena la lectura del
+# cursor en vez de acumular filas en memoria.
+
+UPDATED_AT_FIELD = "updated_at" # Última escritura del producto (exportación incremental)
+EXPORT_FIELDS = PRODUCT_FIELDS + ((VIEWS_FIELD, 0), (UPDATED_AT_FIELD, None))
+EXPORT_PROJECTION = {key: 1 for key, _ in EXPORT_FIELDS}
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+_CHUNK_BYTES = 64 * 1024
+
+
+def utc_now() -> datetime:
+    # Mongo guarda milisegundos: truncar evita comparar con una precisión que no existe
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def default_snapshot() -> datetime:
+    # Un pequeño margen para que las escrituras en curso con una fecha anterior ya sean visibles
+    return utc_now() - timedelta(seconds=settings.EXPORT_SNAPSHOT_LAG_SECONDS)
+
+
+def clamp_snapshot(as_of: Optional[datetime]) -> datetime:
+    # Un corte posterior al por defecto no es consistente: lo escrito hasta
+    # entonces puede o no aparecer, y la exportación incremental siguiente
+    # (updated_since=as_of) se lo saltaría
+    latest = default_snapshot()
+    if as_of is None:
+        return latest
+    if as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+    return min(as_of, latest)
+
+
+def format_datetime(value: datetime) -> str:
+    # Mongo devuelve fechas UTC sin zona
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def snapshot_query(query: dict, as_of: datetime, updated_since: Optional[datetime] = None) -> dict:
+    """
+    Limita el filtro a los productos escritos hasta as_of (y después de
+    updated_since). Lo modificado durante la exportación queda fuera y entra
+    en la siguiente exportación incremental con updated_since=as_of.
+    """
+    window = {"$lte": as_of}
+    if updated_since is not None:
+        window["$gt"] = updated_since
+    return {"$and": [query, {UPDATED_AT_FIELD: window}]} if query else {UPDATED_AT_FIELD: window}
+
+
+def _export_row(doc: dict) -> dict:
+    row = public_doc(doc, EXPORT_FIELDS)
+    if isinstance(row[UPDATED_AT_FIELD], datetime):
+        row[UPDATED_AT_FIELD] = format_datetime(row[UPDATED_AT_FIELD])
+    return row
+
+
+def _csv_line(values: list) -> bytes:
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerow(values)
+    return out.getvalue().encode()
+
+
+def _csv_value(value) -> object:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "|".join(str(item) for item in value) # Mismo formato que la importación CSV
+    return value
+
+
+async def export_stream(cursor: AsyncIOMotorCursor, fmt: str, gzip: bool) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None # wbits=31: formato gzip
+    buffer = bytearray()
+    if fmt == "csv":
+        buffer += _csv_line([key for key, _ in EXPORT_FIELDS])
+    try:
+        async for doc in cursor:
+            row = _export_row(doc)
+            if fmt == "csv":
+                buffer += _csv_line([_csv_value(value) for value in row.values()])
+            else:
+                buffer += to_json(row) + b"\n"
+            if len(buffer) >= _CHUNK_BYTES:
+                chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+                buffer.clear()
+                if chunk:
+                    yield chunk
+        tail = (compressor.compress(bytes(buffer)) + compressor.flush()) if compressor else bytes(buffer)
+        if tail:
+            yield tail
+    finally:
+        # También si el cliente se desconecta a mitad de la descarga
+        await cursor.close()
+
+
+async def backfill_updated_at(db: AsyncIOMotorDatabase, products_collection: str) -> int:
+    # Productos anteriores al campo: se usa la fecha de creación del _id
+    result = await db[products_collection].update_many(
+        {UPDATED_AT_FIELD: {"$exists": False}}, [{"$set": {UPDATED_AT_FIELD: {"$toDate": "$_id"}}}]
+    )
+    return result.modified_count
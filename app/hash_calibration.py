@@ -0,0 +1,106 @@
+import argparse
+import statistics
+import sys
+import time
+
+from passlib.exc import MissingBackendError
+
+from app.config import settings
+from app.security import HASH_SCHEMES, build_pwd_context
+
+# --- Calibración del coste del hash de contraseñas ---
+# python -m app.hash_calibration --target-ms 250
+# python -m app.hash_calibration --scheme argon2 --target-ms 300
+# Mide la verificación en esta máquina con costes crecientes y propone el
+# mayor que queda por debajo del objetivo. Ejecutarlo en el hardware de
+# despliegue: las líneas de la salida van tal cual al .env. Los usuarios con
+# el coste anterior se actualizan solos en su siguiente login.
+
+CALIBRATION_PASSWORD = "calibracion-Agrored-2024"
+BCRYPT_MAX_ROUNDS = 31
+ARGON2_MAX_TIME_COST = 50
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Elige el coste del hash para una latencia de verificación objetivo")
+    parser.add_argument("--scheme", choices=HASH_SCHEMES, default=settings.PASSWORD_HASH_SCHEME)
+    parser.add_argument("--target-ms", type=float, default=250, help="latencia máxima de una verificación")
+    parser.add_argument("--samples", type=int, default=5, help="verificaciones por coste; se usa la mediana")
+    parser.add_argument("--min-bcrypt-rounds", type=int, default=10, help="no proponer menos rondas que esto")
+    parser.add_argument("--argon2-memory-kib", type=int, default=settings.ARGON2_MEMORY_COST_KIB)
+    parser.add_argument("--argon2-parallelism", type=int, default=settings.ARGON2_PARALLELISM)
+    return parser.parse_args(argv)
+
+
+def verify_ms(scheme: str, samples: int, bcrypt_rounds: int = 4, argon2_time_cost: int = 1,
+              argon2_memory_kib: int = 8, argon2_parallelism: int = 1) -> float:
+    context = build_pwd_context(scheme, bcrypt_rounds, argon2_time_cost, argon2_memory_kib, argon2_parallelism)
+    hashed = context.hash(CALIBRATION_PASSWORD)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.verify(CALIBRATION_PASSWORD, hashed)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt(args) -> dict:
+    chosen = None
+    for rounds in range(args.min_bcrypt_rounds, BCRYPT_MAX_ROUNDS + 1):
+        elapsed = verify_ms("bcrypt", args.samples, bcrypt_rounds=rounds)
+        print(f"  bcrypt rounds={rounds}: {elapsed:.1f} ms", file=sys.stderr)
+        if elapsed > args.target_ms:
+            break # Cada ronda duplica el tiempo: no tiene sentido seguir
+        chosen = (rounds, elapsed)
+    if chosen is None:
+        chosen = (args.min_bcrypt_rounds, elapsed)
+        print(f"Aviso: ni el mínimo de {args.min_bcrypt_rounds} rondas cabe en {args.target_ms} ms", file=sys.stderr)
+    return {"env": {"BCRYPT_ROUNDS": chosen[0]}, "verify_ms": chosen[1]}
+
+
+def calibrate_argon2(args) -> dict:
+    # Memoria y paralelismo fijos (los limita la máquina); se sube el número de pasadas
+    chosen = None
+    for time_cost in range(1, ARGON2_MAX_TIME_COST + 1):
+        elapsed = verify_ms(
+            "argon2", args.samples, argon2_time_cost=time_cost,
+            argon2_memory_kib=args.argon2_memory_kib, argon2_parallelism=args.argon2_parallelism,
+        )
+        print(f"  argon2 time_cost={time_cost}: {elapsed:.1f} ms", file=sys.stderr)
+        if elapsed > args.target_ms:
+            break
+        chosen = (time_cost, elapsed)
+    if chosen is None:
+        chosen = (1, elapsed)
+        print(f"Aviso: con {args.argon2_memory_kib} KiB ni una pasada cabe en {args.target_ms} ms", file=sys.stderr)
+    return {
+        "env": {
+            "ARGON2_TIME_COST": chosen[0],
+            "ARGON2_MEMORY_COST_KIB": args.argon2_memory_kib,
+            "ARGON2_PARALLELISM": args.argon2_parallelism,
+        },
+        "verify_ms": chosen[1],
+    }
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    print(f"Calibrando {args.scheme} para {args.target_ms} ms por verificación...", file=sys.stderr)
+    try:
+        result = calibrate_bcrypt(args) if args.scheme == "bcrypt" else calibrate_argon2(args)
+    except MissingBackendError as e:
+        sys.exit(f"No se puede calibrar {args.scheme}: {e}")
+    # Capacidad aproximada del pool de hashing con ese coste
+    per_second = settings.HASH_POOL_WORKERS * 1000 / result["verify_ms"]
+    print(
+        f"Verificación: {result['verify_ms']:.1f} ms; ~{per_second:.0f} logins/s por proceso "
+        f"con HASH_POOL_WORKERS={settings.HASH_POOL_WORKERS}",
+        file=sys.stderr,
+    )
+    print(f"PASSWORD_HASH_SCHEME={args.scheme}")
+    for key, value in result["env"].items():
+        print(f"{key}={value}")
+
+
+if __name__ == "__main__":
+    main()
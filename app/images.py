@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+
+from app.config import settings
+
+# --- Imágenes de productos en GridFS ---
+# La subida se escribe en GridFS a medida que llegan los trozos del cuerpo,
+# sin cargar el archivo entero en memoria. Las miniaturas se generan después
+# de responder, en un pool de procesos para no ocupar el event loop.
+
+IMAGE_BUCKET = "product_images"
+IMAGE_FIELD = "_image" # Metadatos internos de la imagen en el documento del producto
+THUMBNAIL_CONTENT_TYPE = "image/webp"
+
+# Formatos aceptados y cómo reconocerlos por sus primeros bytes
+IMAGE_SIGNATURES = {
+    "image/jpeg": lambda head: head.startswith(b"\xff\xd8\xff"),
+    "image/png": lambda head: head.startswith(b"\x89PNG\r\n\x1a\n"),
+    "image/gif": lambda head: head[:6] in (b"GIF87a", b"GIF89a"),
+    "image/webp": lambda head: head[:4] == b"RIFF" and head[8:12] == b"WEBP",
+}
+_SNIFF_BYTES = 12
+
+
+def image_version(image: dict) -> str:
+    # Va en image_url (?v=): cambia con cada imagen nueva
+    return image["etag"][:16]
+
+
+def image_bucket(db: AsyncIOMotorDatabase) -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=IMAGE_BUCKET)
+
+
+def thumbnail_sizes() -> List[int]:
+    return sorted({int(size) for size in settings.PRODUCT_THUMBNAIL_SIZES.split(",") if size.strip()})
+
+
+async def store_image(
+    db: AsyncIOMotorDatabase, product_id: str, content_type: str, chunks: AsyncIterator[bytes]
+) -> dict:
+    grid_in = image_bucket(db).open_upload_stream(
+        product_id, metadata={"product_id": product_id, "content_type": content_type}
+    )
+    digest = hashlib.sha256()
+    head = b""
+    length = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            length += len(chunk)
+            if length > settings.PRODUCT_IMAGE_MAX_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                    detail=f"La imagen supera el máximo de {settings.PRODUCT_IMAGE_MAX_BYTES} bytes",
+                )
+            if len(head) < _SNIFF_BYTES:
+                head += chunk[:_SNIFF_BYTES]
+            digest.update(chunk)
+            await grid_in.write(chunk)
+        if length == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La imagen está vacía")
+        if not IMAGE_SIGNATURES[content_type](head):
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="El contenido no corresponde al tipo de imagen indicado",
+            )
+    except BaseException:
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+    return {
+        "file_id": grid_in._id,
+        "etag": digest.hexdigest()[:32],
+        "length": length,
+        "content_type": content_type,
+        "thumbnails": {},
+    }
+
+
+async def delete_image_files(db: AsyncIOMotorDatabase, image: dict) -> None:
+    bucket = image_bucket(db)
+    file_ids = [image["file_id"]] + [thumb["file_id"] for thumb in image.get("thumbnails", {}).values()]
+    for file_id in file_ids:
+        try:
+            await bucket.delete(file_id)
+        except NoFile:
+            pass
+
+
+# --- Miniaturas ---
+
+_image_executor: Optional[ProcessPoolExecutor] = None
+
+
+def thumbnails_available() -> bool:
+    return find_spec("PIL") is not None
+
+
+def _get_image_executor() -> ProcessPoolExecutor:
+    global _image_executor
+    if _image_executor is None:
+        # spawn: no heredar del proceso padre los hilos de Motor ni del pool de hashing
+        _image_executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _image_executor
+
+
+def shutdown_image_pool() -> None:
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=True, cancel_futures=True)
+        _image_executor = None
+
+
+def make_thumbnails(data: bytes, sizes: List[int]) -> Dict[int, bytes]:
+    # Se ejecuta en un proceso del pool: decodifica una vez y reduce a cada tamaño
+    from PIL import Image, ImageOps
+
+    thumbnails = {}
+    with Image.open(io.BytesIO(data)) as source:
+        source.draft("RGB", (max(sizes), max(sizes))) # Decodificación reducida en JPEG
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size))
+            out = io.BytesIO()
+            image.save(out, "WEBP", quality=80)
+            thumbnails[size] = out.getvalue()
+    return thumbnails
+
+
+async def generate_thumbnails(db: AsyncIOMotorDatabase, collection_name: str, product_id: str, file_id: ObjectId) -> None:
+    sizes = thumbnail_sizes()
+    if not sizes or not thumbnails_available():
+        return
+    bucket = image_bucket(db)
+    try:
+        grid_out = await bucket.open_download_stream(file_id)
+        data = await grid_out.read()
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(_get_image_executor(), make_thumbnails, data, sizes)
+    except Exception as e:
+        print(f"No se pudieron generar miniaturas del producto {product_id}: {e}")
+        return
+
+    thumbnails = {}
+    for size, body in rendered.items():
+        thumb_id = await bucket.upload_from_stream(
+            f"{product_id}@{size}", body,
+            metadata={"product_id": product_id, "content_type": THUMBNAIL_CONTENT_TYPE, "size": size},
+        )
+        thumbnails[str(size)] = {
+            "file_id": thumb_id,
+            "etag": hashlib.sha256(body).hexdigest()[:32],
+            "length": len(body),
+            "content_type": THUMBNAIL_CONTENT_TYPE,
+        }
+    # Solo si la imagen sigue siendo la misma; si la reemplazaron entretanto, se descartan
+    result = await db[collection_name].update_one(
+        {"_id": ObjectId(product_id), f"{IMAGE_FIELD}.file_id": file_id},
+        {"$set": {f"{IMAGE_FIELD}.thumbnails": thumbnails}},
+    )
+    if result.matched_count == 0:
+        await delete_image_files(db, {"file_id": file_id, "thumbnails": thumbnails})
+
+
+# --- Lectura con rangos ---
+
+def parse_range(range_header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta una cabecera Range de un solo rango ("bytes=0-99", "bytes=100-",
+    "bytes=-500") y devuelve (inicio, fin) inclusivos, o None para servir el
+    archivo completo. Lanza 416 si el rango no se puede satisfacer.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else length - 1
+        else:
+            start, end = max(0, length - int(end_text)), length - 1
+    except ValueError:
+        return None
+    end = min(end, length - 1)
+    if start > end or start >= length:
+        raise HTTPException(
+            status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+            detail="Rango no satisfacible",
+            headers={"Content-Range": f"bytes */{length}"},
+        )
+    return start, end
+
+
+async def stream_image(db: AsyncIOMotorDatabase, file_id: ObjectId, start: int, end: int) -> AsyncIterator[bytes]:
+    grid_out = await image_bucket(db).open_download_stream(file_id)
+    if start:
+        grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = await grid_out.read(min(remaining, grid_out.chunk_size))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
@@ -0,0 +1,115 @@
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+# --- Registro declarativo de índices ---
+# Cada colección lista los índices que la API necesita. El lifespan los crea
+# al arrancar (create_indexes es idempotente) y compara con los existentes.
+
+INDEX_REGISTRY = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "products": [
+        # Filtros del listado + orden con _id como desempate (paginación por cursor).
+        # Cubiertos: sin filtro, category o tags (igualdad o $in de un valor), con
+        # cualquier orden (por defecto _id, price, name, popular). Quedan fuera a
+        # propósito in_stock, currency y el rango de precio con otro orden: se
+        # aplican como filtro residual sobre el índice del orden, que sigue
+        # evitando el sort en memoria. Con category y tags a la vez se usa el
+        # índice de uno de los dos.
+        IndexModel([("category", ASCENDING), ("_id", ASCENDING)], name="category_id"),
+        IndexModel([("category", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], name="category_price"),
+        IndexModel([("category", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)], name="category_name"),
+        IndexModel([("tags", ASCENDING), ("_id", ASCENDING)], name="tags_id"),
+        IndexModel([("tags", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], name="tags_price"),
+        IndexModel([("tags", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)], name="tags_name"),
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price_id"),
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name_id"),
+        # Exportación incremental (updated_since)
+        IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)], name="updated_at_id"),
+        # Orden por popularidad (sort=popular)
+        IndexModel([("views", DESCENDING), ("_id", DESCENDING)], name="views_id"),
+        IndexModel([("category", ASCENDING), ("views", DESCENDING), ("_id", DESCENDING)], name="category_views"),
+        IndexModel([("tags", ASCENDING), ("views", DESCENDING), ("_id", DESCENDING)], name="tags_views"),
+        # Búsqueda por texto con relevancia
+        IndexModel(
+            [("name", TEXT), ("description", TEXT), ("tags", TEXT)],
+            name="text_search",
+            weights={"name": 10, "tags": 5, "description": 1},
+            default_language="spanish",
+        ),
+    ],
+}
+
+
+# Opciones que cambian el comportamiento del índice; si difieren, create_indexes
+# no lo corrige (el nombre ya existe) y hay que recrearlo a mano
+COMPARED_OPTIONS = (
+    "unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "collation", "weights", "default_language",
+)
+_OPTION_DEFAULTS = {"unique": False, "sparse": False}
+
+
+def _option_drift(wanted: dict, info: dict) -> dict:
+    drift = {}
+    # Los índices de texto se guardan con claves internas (_fts, _ftsx): no se comparan
+    if "_fts" not in dict(info["key"]) and tuple(wanted["key"].items()) != tuple(info["key"]):
+        drift["key"] = {"expected": list(wanted["key"].items()), "found": list(info["key"])}
+    for option in COMPARED_OPTIONS:
+        expected = wanted.get(option, _OPTION_DEFAULTS.get(option))
+        found = info.get(option, _OPTION_DEFAULTS.get(option))
+        if option == "collation" and expected and found:
+            # El servidor completa la collation con valores por defecto: solo se comparan los declarados
+            found = {name: found.get(name) for name in expected}
+        elif option in ("weights", "default_language") and expected is None:
+            continue # Solo aplican a índices de texto
+        if isinstance(found, dict):
+            found = dict(found)
+        if expected != found:
+            drift[option] = {"expected": expected, "found": found}
+    return drift
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Crea los índices del registro que falten y devuelve, por colección,
+    los índices creados, los que existen en la base pero no en el registro
+    y los del registro que existen con otras claves u opciones.
+    """
+    report = {}
+    for collection_name, models in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        information = await collection.index_information()
+        # Se compara por claves y no por nombre: un índice equivalente creado
+        # a mano con otro nombre haría fallar create_indexes
+        existing = {
+            tuple((field, direction) for field, direction in info["key"]): name
+            for name, info in information.items()
+        }
+        existing_names = set(existing.values())
+        wanted = {tuple(model.document["key"].items()) for model in models}
+        wanted_names = {model.document["name"] for model in models}
+
+        missing = [
+            model for model in models
+            if tuple(model.document["key"].items()) not in existing
+            and model.document["name"] not in existing_names
+        ]
+        if missing:
+            await collection.create_indexes(missing)
+
+        mismatched = {}
+        for model in models:
+            if model in missing:
+                continue
+            name = existing.get(tuple(model.document["key"].items()), model.document["name"])
+            drift = _option_drift(model.document, information[name]) if name in information else {}
+            if drift:
+                mismatched[name] = drift
+
+        report[collection_name] = {
+            "created": sorted(model.document["name"] for model in missing),
+            "mismatched": mismatched,
+            "unmanaged": sorted(name for key, name in existing.items() if key not in wanted and name not in wanted_names and name != "_id_"),
+        }
+    return report
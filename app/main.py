@@ -1,18 +1,34 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware # Asegúrate que esto está importado
 from contextlib import asynccontextmanager
-from motor.motor_asyncio import AsyncIOMotorClient
 
+from app.autocomplete import suggest_index
+
+from app.change_feed import product_feed
 from app.config import settings
 from app.routers import product_router, user_router, auth_router
 import app.dependencies as global_deps
+from app.database import create_mongo_client, with_read_preference
+from app.deadlines import AdmissionMiddleware
+from app.export import backfill_updated_at
+from app.dependencies import get_current_active_superuser, is_superuser_token
+from app.images import shutdown_image_pool
+from app.indexes import ensure_indexes
+from app.metrics import MetricsMiddleware, render_metrics
+from app.profiling import ProfilingMiddleware, get_profile, list_profiles, speedscope_response
+from app.security import get_password_hash_async, hashing_stats, shutdown_hash_pool
+from app.view_counter import backfill_view_counts, view_counter
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Iniciando aplicación...")
     # Conectar a MongoDB
-    global_deps.mongo_client = AsyncIOMotorClient(settings.MONGO_URI)
+    global_deps.mongo_client = create_mongo_client()
     global_deps.database_instance = global_deps.mongo_client[settings.MONGO_DB_NAME]
+    global_deps.product_read_database = with_read_preference(
+        global_deps.database_instance, settings.MONGO_PRODUCT_READ_PREFERENCE
+    )
     try:
         await global_deps.mongo_client.admin.command('ping')
         print(f"Conectado a MongoDB: {settings.MONGO_DB_NAME}")
@@ -20,10 +36,45 @@ async def lifespan(app: FastAPI):
         print(f"Error al conectar a MongoDB: {e}")
         global_deps.mongo_client = None # Asegurar que no se use un cliente fallido
         global_deps.database_instance = None
+        global_deps.product_read_database = None
         raise # Re-lanzar para que FastAPI sepa que el inicio falló
 
+    # Crear índices que falten y reportar diferencias con el registro
+    index_report = await ensure_indexes(global_deps.database_instance)
+    for collection_name, result in index_report.items():
+        print(f"Índices de '{collection_name}': creados={result['created']} no registrados={result['unmanaged']}")
+        for index_name, drift in result["mismatched"].items():
+            # No se recrean solos: cambiar un índice en producción es una decisión manual
+            print(f"Aviso: el índice '{collection_name}.{index_name}' difiere del registro: {drift}")
+    backfilled = await backfill_view_counts(global_deps.database_instance, product_router.PRODUCT_COLLECTION)
+    if backfilled:
+        print(f"Contador de visitas inicializado en {backfilled} productos.")
+    backfilled = await backfill_updated_at(global_deps.database_instance, product_router.PRODUCT_COLLECTION)
+    if backfilled:
+        print(f"Fecha de actualización inicializada en {backfilled} productos.")
+    view_counter.start(global_deps.database_instance)
+
+    # Calentamiento: backend de bcrypt e hilos del pool, y caché de productos
+    await get_password_hash_async("warmup")
+    if settings.WARMUP_PRODUCT_CACHE > 0:
+        loaded = await product_router.warm_product_cache(
+            global_deps.product_read_database, settings.WARMUP_PRODUCT_CACHE
+        )
+        print(f"Caché de productos precargada con {loaded} productos.")
+    indexed = await suggest_index.rebuild(global_deps.product_read_database[product_router.PRODUCT_COLLECTION])
+    print(f"Índice de autocompletado con {indexed} productos.")
+    suggest_index.start(global_deps.product_read_database[product_router.PRODUCT_COLLECTION])
+
     print(f"API {settings.PROJECT_NAME} iniciada.")
     yield
+    # Cerrar el change stream y las conexiones SSE abiertas
+    await product_feed.stop()
+    # Escribir las visitas que queden en memoria
+    await view_counter.stop()
+    await suggest_index.stop()
+    # Esperar a que terminen los hashes en curso
+    shutdown_hash_pool()
+    shutdown_image_pool()
     # Desconectar de MongoDB
     if global_deps.mongo_client:
         global_deps.mongo_client.close()
@@ -38,6 +89,14 @@ app = FastAPI(
     redoc_url="/api/v1/redoc"
 )
 
+# Perfilado bajo demanda, dentro del control de admisión: no se perfilan peticiones rechazadas
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, authorize=is_superuser_token)
+
+# Control de admisión: 503 inmediato si hay sobrecarga (dentro de CORS para
+# que la respuesta lleve sus cabeceras)
+app.add_middleware(AdmissionMiddleware)
+
 # Configuración de CORS (ajusta 'origins' según tu frontend)
 origins = [
     "http://localhost:5173",  # Puerto por defecto de Vite para el frontend
@@ -51,6 +110,8 @@ app.add_middleware(
     allow_methods=["*"],         # Permite todos los métodos (GET, POST, etc.)
     allow_headers=["*"],         # Permite todas las cabeceras
 )
+# Métricas por ruta (latencia, códigos de estado, peticiones en curso)
+app.add_middleware(MetricsMiddleware)
 
 # Incluir routers
 API_V1_STR = "/api/v1"
@@ -62,6 +123,37 @@ app.include_router(product_router.router, prefix=f"{API_V1_STR}/products", tags=
 async def health_check():
     return {"status": "ok", "message": f"Servicio {settings.PROJECT_NAME} funcionando."}
 
+@app.get(f"{API_V1_STR}/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def read_metrics():
+    # Formato de texto de Prometheus
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get(f"{API_V1_STR}/stats", tags=["Health"], dependencies=[Depends(get_current_active_superuser)])
+async def read_stats():
+    # Métricas internas para diagnóstico (solo superusuarios)
+    return {
+        "password_hashing": hashing_stats(),
+        "user_cache": global_deps.user_cache.stats(),
+        "product_cache": product_router.product_cache.stats(),
+        "facet_cache": product_router.facet_cache.stats(),
+        "view_counter": view_counter.stats(),
+        "product_loader": product_router.product_loader.stats(),
+        "suggest_index": suggest_index.stats(),
+    }
+
+@app.get(f"{API_V1_STR}/profiles", tags=["Health"], dependencies=[Depends(get_current_active_superuser)])
+async def read_profiles():
+    # Perfiles recientes de este proceso, el más nuevo primero
+    return list_profiles()
+
+@app.get(f"{API_V1_STR}/profiles/{{profile_id}}", tags=["Health"], dependencies=[Depends(get_current_active_superuser)])
+async def download_profile(profile_id: str):
+    # Archivo speedscope: abrir en https://www.speedscope.app
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil no encontrado")
+    return speedscope_response(profile)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
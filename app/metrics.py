@@ -0,0 +1,351 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+from app.config import settings
+from app.profiling import record_timing
+
+# --- Métricas en formato de texto de Prometheus ---
+# Registro mínimo sin dependencias externas. Los listeners de pymongo se
+# ejecutan en los hilos de Motor, por eso cada métrica protege su estado
+# con un lock.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set_total(self, value: float, *label_values: str) -> None:
+        # Para contadores que se llevan en otro sitio (ej. hits de una caché)
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[LabelValues, list] = {} # [conteos por bucket..., suma]
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(state)) for labels, state in self._values.items()]
+        lines = self._header()
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            label_str = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+# Funciones que actualizan gauges justo antes de exponerlos (cachés, pools...)
+_COLLECTORS: List[Callable[[], None]] = []
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    _COLLECTORS.append(fn)
+
+
+def render_metrics() -> str:
+    for collector in _COLLECTORS:
+        collector()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Peticiones HTTP ---
+http_requests_total = Counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route")
+)
+http_requests_in_flight = Gauge("http_requests_in_flight", "Peticiones HTTP en curso")
+
+
+def _route_template(scope) -> str:
+    # Plantilla de la ruta ("/api/v1/products/{product_id}") para no crear
+    # una serie por cada id: se sustituyen los segmentos que son path params
+    if "endpoint" not in scope:
+        return "unmatched"
+    params = {str(value): name for name, value in (scope.get("path_params") or {}).items()}
+    if not params:
+        return scope["path"]
+    return "/".join(
+        "{" + params[segment] + "}" if segment in params else segment
+        for segment in scope["path"].split("/")
+    )
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia, código de estado y peticiones en curso por ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            route_path = _route_template(scope)
+            http_request_duration_seconds.observe(elapsed, scope["method"], route_path)
+            http_requests_total.inc(scope["method"], route_path, str(status_code))
+
+
+# --- Hashing de contraseñas ---
+password_hash_seconds = Histogram(
+    "password_hash_seconds", "Tiempo de bcrypt por operación", ("operation",)
+)
+password_hash_latency_seconds = Histogram(
+    "password_hash_latency_seconds", "Espera en cola + bcrypt por operación", ("operation",)
+)
+password_hash_rejected_total = Counter(
+    "password_hash_rejected_total", "Operaciones rechazadas con la cola de hashing llena"
+)
+password_hash_queue_depth = Gauge("password_hash_queue_depth", "Operaciones de hashing en cola o en curso")
+password_rehashed_total = Counter(
+    "password_rehashed_total", "Hashes actualizados al esquema o coste vigente durante el login"
+)
+
+
+# --- Cachés en memoria ---
+cache_hits_total = Counter("cache_hits_total", "Aciertos de caché", ("cache",))
+cache_misses_total = Counter("cache_misses_total", "Fallos de caché", ("cache",))
+cache_entries = Gauge("cache_entries", "Entradas en caché", ("cache",))
+
+
+def register_cache(name: str, cache) -> None:
+    def collect():
+        cache_hits_total.set_total(cache.hits, name)
+        cache_misses_total.set_total(cache.misses, name)
+        cache_entries.set(len(cache), name)
+    register_collector(collect)
+
+
+# --- Comandos de MongoDB ---
+mongo_command_duration_seconds = Histogram(
+    "mongo_command_duration_seconds", "Latencia de comandos MongoDB", ("command", "collection")
+)
+mongo_command_failures_total = Counter(
+    "mongo_command_failures_total", "Comandos MongoDB fallidos", ("command", "collection")
+)
+mongo_slow_commands_total = Counter(
+    "mongo_slow_commands_total", "Comandos MongoDB más lentos que MONGO_SLOW_COMMAND_MS", ("command", "collection")
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, event) -> tuple:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        with self._lock:
+            self._collections[self._key(event)] = collection
+
+    def _finish(self, event) -> Tuple[str, float]:
+        with self._lock:
+            collection = self._collections.pop(self._key(event), "-")
+        seconds = event.duration_micros / 1_000_000
+        mongo_command_duration_seconds.observe(seconds, event.command_name, collection)
+        record_timing("mongo", seconds) # Motor copia el contexto de la petición a su hilo
+        if seconds * 1000 >= settings.MONGO_SLOW_COMMAND_MS:
+            mongo_slow_commands_total.inc(event.command_name, collection)
+        return collection, seconds
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        collection, _ = self._finish(event)
+        mongo_command_failures_total.inc(event.command_name, collection)
+
+
+# --- Pool de conexiones de MongoDB ---
+mongo_pool_connections = Gauge("mongo_pool_connections", "Conexiones abiertas en el pool", ("address",))
+mongo_pool_checked_out = Gauge("mongo_pool_checked_out", "Conexiones prestadas a operaciones", ("address",))
+mongo_pool_checkout_failures_total = Counter(
+    "mongo_pool_checkout_failures_total", "Fallos al obtener una conexión del pool", ("address", "reason")
+)
+mongo_pool_cleared_total = Counter("mongo_pool_cleared_total", "Veces que se vació el pool", ("address",))
+mongo_pool_waiters = Gauge("mongo_pool_waiters", "Operaciones esperando una conexión del pool")
+_pool_waiting = 0 # Lo consulta el control de admisión
+_pool_waiting_lock = threading.Lock() # Los eventos del pool llegan desde varios hilos
+
+
+def mongo_pool_wait_queue() -> int:
+    return _pool_waiting
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        mongo_pool_cleared_total.inc(self._address(event))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(self._address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(self._address(event))
+
+    @staticmethod
+    def _waiting(delta: int) -> None:
+        global _pool_waiting
+        with _pool_waiting_lock:
+            _pool_waiting = max(0, _pool_waiting + delta)
+            mongo_pool_waiters.set(_pool_waiting)
+
+    def connection_check_out_started(self, event):
+        self._waiting(1)
+
+    def connection_check_out_failed(self, event):
+        self._waiting(-1)
+        mongo_pool_checkout_failures_total.inc(self._address(event), str(event.reason))
+
+    def connection_checked_out(self, event):
+        self._waiting(-1)
+        mongo_pool_checked_out.inc(self._address(event))
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec(self._address(event))
+
+
+def mongo_event_listeners() -> list:
+    return [MongoCommandMetrics(), MongoPoolMetrics()]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr, ConfigDict
 from bson import ObjectId
-from typing import Optional, List
+from typing import Any, Optional, List
 from pydantic_core import core_schema 
 
 # --- ObjectId Handling ---
@@ -76,6 +76,10 @@ class UserRead(UserBase): # Esquema para devolver al cliente (sin password)
     is_superuser: bool
     model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, json_encoders={ObjectId: str})
 
+class UserPage(BaseModel): # Página de usuarios con cursor para la siguiente
+    items: List[UserRead]
+    next_cursor: Optional[str] = None
+
 
 # --- Product Models ---
 class ProductBase(BaseModel):
@@ -107,6 +111,66 @@ class ProductRead(ProductBase):
     id: PyObjectId = Field(alias="_id")
     model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, json_encoders={ObjectId: str})
 
+class ProductPage(BaseModel): # Página de productos con cursor para la siguiente
+    items: List[ProductRead]
+    next_cursor: Optional[str] = None
+
+class ProductBatch(BaseModel): # Productos en el orden pedido y los ids que no existen
+    items: List[ProductRead]
+    not_found: List[str]
+
+class ProductSuggestion(BaseModel): # Resultado del autocompletado, ya ordenado
+    id: PyObjectId = Field(alias="_id")
+    name: str
+    category: str
+    price: float
+    stock: int
+    image_url: Optional[str] = None
+    model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, json_encoders={ObjectId: str})
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceBucket(BaseModel):
+    min: float
+    max: float
+    count: int
+
+class ProductFacets(BaseModel):
+    total: int
+    categories: List[FacetCount]
+    tags: List[FacetCount]
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    price_histogram: List[PriceBucket]
+
+class ImportRowError(BaseModel):
+    row: int # Número de fila de datos (1 = primera fila)
+    detail: Any
+
+class BulkImportResult(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[ImportRowError]
+    errors_truncated: bool = False
+
+class StockAdjustment(BaseModel):
+    product_id: str = Field(..., pattern=r"^[0-9a-fA-F]{24}$")
+    delta: int # Negativo para descontar stock
+
+class StockAdjustRequest(BaseModel):
+    items: List[StockAdjustment] = Field(..., min_length=1, max_length=500)
+
+class StockAdjustRejection(BaseModel):
+    product_id: str
+    reason: str # "insufficient_stock" o "not_found"
+
+class StockAdjustResult(BaseModel):
+    applied: List[str]
+    rejected: List[StockAdjustRejection]
+
 
 # --- Token Models ---
 class Token(BaseModel):
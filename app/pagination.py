@@ -0,0 +1,120 @@
+import base64
+import json
+from typing import Any, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+# --- Paginación por cursor (keyset) ---
+# El cursor es opaco para el cliente: base64url de un JSON con el último _id
+# devuelto y, si la lista está ordenada por otro campo, el valor de ese campo.
+# Así cada página es un rango sobre un índice y no depende de skip().
+
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return settings.DEFAULT_PAGE_SIZE
+    return max(1, min(limit, settings.MAX_PAGE_SIZE))
+
+
+def _encode_payload(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_payload(token: str) -> dict:
+    padded = token + "=" * (-len(token) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(payload, dict):
+        raise ValueError("cursor")
+    return payload
+
+
+def encode_cursor(last_id: ObjectId, sort_value: Any = None) -> str:
+    payload = {"id": str(last_id)}
+    if sort_value is not None:
+        payload["v"] = sort_value
+    return _encode_payload(payload)
+
+
+def decode_cursor(token: str) -> Tuple[ObjectId, Any]:
+    try:
+        payload = _decode_payload(token)
+        last_id = ObjectId(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido")
+    return last_id, payload.get("v")
+
+
+def keyset_filter(cursor: Optional[str], sort_field: Optional[str] = None, direction: int = 1) -> dict:
+    """
+    Devuelve el filtro que continúa la lista después del cursor.
+    Con sort_field se ordena por (sort_field, _id) y el _id desempata.
+    """
+    if not cursor:
+        return {}
+    last_id, last_value = decode_cursor(cursor)
+    op = "$gt" if direction >= 0 else "$lt"
+    if sort_field is None or sort_field == "_id":
+        return {"_id": {op: last_id}}
+    return {
+        "$or": [
+            {sort_field: {op: last_value}},
+            {sort_field: last_value, "_id": {op: last_id}},
+        ]
+    }
+
+
+async def fetch_page(collection, query: dict, cursor: Optional[str], limit: int,
+                     sort_field: Optional[str] = None, direction: int = 1,
+                     projection: Optional[dict] = None):
+    """
+    Lee como máximo limit + 1 documentos para saber si hay otra página
+    sin contar la colección. Devuelve (docs, next_cursor).
+    """
+    after = keyset_filter(cursor, sort_field, direction)
+    if after:
+        query = {"$and": [query, after]} if query else after
+    sort = [("_id", direction)]
+    if sort_field and sort_field != "_id":
+        sort.insert(0, (sort_field, direction))
+    db_cursor = collection.find(query, projection).sort(sort).limit(limit + 1).batch_size(limit + 1)
+    docs = await db_cursor.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        sort_value = last.get(sort_field) if sort_field and sort_field != "_id" else None
+        next_cursor = encode_cursor(last["_id"], sort_value)
+    return docs, next_cursor
+
+
+async def fetch_text_page(collection, query: dict, cursor: Optional[str], limit: int,
+                          projection: Optional[dict] = None):
+    """
+    Página ordenada por relevancia ($text). textScore no se puede usar en un
+    filtro, así que aquí el cursor guarda un desplazamiento; las búsquedas por
+    texto rara vez pasan de las primeras páginas.
+    """
+    offset = 0
+    if cursor:
+        try:
+            offset = int(_decode_payload(cursor)["o"])
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido")
+    projection = {**(projection or {}), "score": {"$meta": "textScore"}}
+    db_cursor = (
+        collection.find(query, projection)
+        .sort([("score", {"$meta": "textScore"}), ("_id", 1)])
+        .skip(offset).limit(limit + 1).batch_size(limit + 1)
+    )
+    docs = await db_cursor.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_payload({"o": offset + limit})
+    return docs, next_cursor
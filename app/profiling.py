@@ -0,0 +1,242 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import Response
+
+from app.config import settings
+from app.serialization import json_response
+
+# --- Perfilado de peticiones bajo demanda ---
+# Con la cabecera X-Profile (token de superusuario) o para una fracción
+# PROFILE_SAMPLE_RATE de las peticiones, un hilo toma muestras de la pila del
+# event loop mientras corre la tarea de esa petición. Lo que se espera fuera
+# del loop (pool de hashing, comandos de Mongo) se mide aparte con
+# record_timing. Sin perfil activo el middleware solo mira las cabeceras.
+# Los perfiles quedan en un buffer circular por proceso y se descargan en
+# formato speedscope (https://www.speedscope.app).
+
+PROFILE_HEADER = b"x-profile" # "1" guarda el perfil; "download" lo devuelve en lugar de la respuesta
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_EXEMPT_PATHS = ("/api/v1/metrics", "/api/v1/products/stream")
+_MAX_STACK_DEPTH = 128
+
+# Categoría de cada muestra según el frame más interno que coincida
+SAMPLE_CATEGORIES = (
+    ("hashing", ("/passlib/", "/bcrypt/", "app/security.py")),
+    ("validation", ("/pydantic/", "/pydantic_core/", "/fastapi/_compat", "app/models.py")),
+    ("json", ("app/serialization.py", "/fastapi/encoders.py", "/starlette/responses.py")),
+)
+TIMING_CATEGORIES = ("hashing", "mongo") # Medidas con record_timing (fuera del loop)
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+_profiles: Deque["RequestProfile"] = deque(maxlen=settings.PROFILE_BUFFER_SIZE)
+_running = 0
+
+
+def record_timing(category: str, seconds: float) -> None:
+    """Suma tiempo esperado fuera del event loop al perfil de la petición en curso, si lo hay."""
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add_timing(category, seconds)
+
+
+def _sample_category(stack: List[tuple]) -> str:
+    for _, filename, _ in reversed(stack):
+        filename = filename.replace("\\", "/")
+        for category, patterns in SAMPLE_CATEGORIES:
+            if any(pattern in filename for pattern in patterns):
+                return category
+    return "other"
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = str(ObjectId())
+        self.method = method
+        self.path = path
+        self.trigger = trigger # "header" o "sample"
+        self.started_at = datetime.now(timezone.utc)
+        self.status_code: Optional[int] = None
+        self.duration = 0.0
+        self._frames: Dict[tuple, int] = {}
+        self._stacks: Counter = Counter() # Pila (índices de frames) -> segundos
+        self._sampled: Counter = Counter() # Categoría -> segundos en el loop
+        self._timings: Counter = Counter() # Categoría -> segundos fuera del loop
+        self._samples = 0
+        self._lock = threading.Lock() # record_timing llega también desde hilos de Motor
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start = 0.0
+
+    def add_timing(self, category: str, seconds: float) -> None:
+        with self._lock:
+            self._timings[category] += seconds
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        thread_id = threading.get_ident()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._sample, args=(loop, task, thread_id), name=f"profile-{self.id}", daemon=True
+        )
+        self._thread.start()
+
+    def finish(self, status_code: int) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._start
+        self.status_code = status_code
+
+    def _sample(self, loop, task, thread_id: int) -> None:
+        interval = settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        last = time.perf_counter()
+        while not self._stop.wait(interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            # Solo cuenta si en ese momento el loop está ejecutando esta petición
+            if asyncio.current_task(loop) is not task:
+                continue
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None and len(stack) < _MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse() # De la raíz a la hoja
+            self._stacks[tuple(self._frames.setdefault(key, len(self._frames)) for key in stack)] += elapsed
+            self._sampled[_sample_category(stack)] += elapsed
+            self._samples += 1
+
+    def summary(self) -> dict:
+        timings = {category: self._timings[category] + self._sampled[category] for category in TIMING_CATEGORIES}
+        for category, _ in SAMPLE_CATEGORIES:
+            timings.setdefault(category, self._sampled[category])
+        timings["other"] = self._sampled["other"]
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status_code,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self._samples,
+            # hashing y mongo: tiempo esperado (incluye la cola); el resto: muestras en el event loop
+            "timings_ms": {category: round(seconds * 1000, 3) for category, seconds in timings.items()},
+        }
+
+    def speedscope(self) -> dict:
+        frames = [{"name": name, "file": filename, "line": line} for name, filename, line in self._frames]
+        samples = [list(stack) for stack in self._stacks]
+        weights = [round(seconds * 1000, 3) for seconds in self._stacks.values()]
+        # Las esperas fuera del loop aparecen como pilas propias para verlas en el mismo gráfico
+        for category in TIMING_CATEGORIES:
+            if self._timings[category]:
+                frames.append({"name": f"[espera] {category}"})
+                samples.append([len(frames) - 1])
+                weights.append(round(self._timings[category] * 1000, 3))
+        name = f"{self.method} {self.path}"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": settings.PROJECT_NAME,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "summary": self.summary(),
+        }
+
+
+def list_profiles() -> List[dict]:
+    return [profile.summary() for profile in reversed(_profiles)]
+
+
+def get_profile(profile_id: str) -> Optional[RequestProfile]:
+    return next((profile for profile in _profiles if profile.id == profile_id), None)
+
+
+def speedscope_response(profile: RequestProfile) -> Response:
+    return json_response(profile.speedscope(), headers={
+        "Content-Disposition": f'attachment; filename="profile-{profile.id}.speedscope.json"',
+        PROFILE_ID_HEADER: profile.id,
+    })
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI: perfila la petición si lo pide un superusuario con la
+    cabecera X-Profile o si le toca por muestreo. authorize recibe el token
+    Bearer y dice si es de un superusuario activo.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], Awaitable[bool]]):
+        self.app = app
+        self.authorize = authorize
+
+    async def _trigger(self, scope) -> Tuple[Optional[str], bool]:
+        requested = _header(scope, PROFILE_HEADER)
+        if requested is not None:
+            authorization = (_header(scope, b"authorization") or b"").decode("latin-1")
+            scheme, _, token = authorization.partition(" ")
+            if scheme.lower() == "bearer" and token and await self.authorize(token):
+                return "header", requested.strip().lower() == b"download"
+            return None, False # Cabecera sin permisos: se ignora
+        if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "sample", False
+        return None, False
+
+    async def __call__(self, scope, receive, send):
+        global _running
+        if scope["type"] != "http" or scope["path"] in PROFILE_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        trigger, download = await self._trigger(scope)
+        if trigger is None or _running >= settings.PROFILE_MAX_CONCURRENT:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], trigger)
+        status_code = 500
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            if not download: # Con "download" la respuesta de la ruta se descarta
+                await send(message)
+
+        _running += 1
+        context_token = _active_profile.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.finish(status_code)
+            _active_profile.reset(context_token)
+            _running -= 1
+            _profiles.append(profile)
+        if download:
+            await speedscope_response(profile)(scope, receive, send)
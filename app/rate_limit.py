@@ -0,0 +1,100 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+
+from app.config import settings
+from app.metrics import Counter
+
+# --- Limitación de intentos (token bucket) ---
+# Va delante de login y registro como dependencia, así que un intento
+# rechazado responde 429 sin llegar a bcrypt ni a Mongo.
+
+rate_limited_total = Counter("rate_limited_total", "Peticiones rechazadas por límite de intentos", ("scope",))
+
+
+class RateLimitBackend(ABC):
+    """
+    Interfaz de almacenamiento de los buckets. acquire() consume un token de
+    la clave y devuelve 0 si se permitió o los segundos a esperar si no.
+    Para compartir límites entre workers o instancias se implementa esta
+    interfaz sobre un almacén común (p. ej. Redis) y se registra con
+    set_rate_limit_backend().
+    """
+
+    @abstractmethod
+    async def acquire(self, key: str, rate_per_second: float, burst: int) -> float:
+        ...
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets en memoria del proceso; se descartan los menos usados al superar max_keys."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, key: str, rate_per_second: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - last) * rate_per_second)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rate_per_second
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+_backend: RateLimitBackend = InMemoryRateLimitBackend(settings.RATE_LIMIT_MAX_KEYS)
+
+
+def set_rate_limit_backend(backend: RateLimitBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+async def enforce(scope: str, key: str, per_minute: float, burst: int) -> None:
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    wait = await _backend.acquire(f"{scope}:{key}", per_minute / 60, burst)
+    if wait > 0:
+        rate_limited_total.inc(scope)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos, intenta de nuevo más tarde",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+
+def client_ip(request: Request) -> str:
+    # Detrás de un proxy, uvicorn (proxy_headers) ya reescribe request.client
+    return request.client.host if request.client else "unknown"
+
+
+async def limit_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()) -> None:
+    await enforce("login_ip", client_ip(request), settings.LOGIN_RATE_PER_IP_PER_MINUTE, settings.LOGIN_BURST_PER_IP)
+    await enforce(
+        "login_email", form_data.username.strip().lower(),
+        settings.LOGIN_RATE_PER_EMAIL_PER_MINUTE, settings.LOGIN_BURST_PER_EMAIL,
+    )
+
+
+async def limit_signup(request: Request) -> None:
+    await enforce("signup_ip", client_ip(request), settings.SIGNUP_RATE_PER_IP_PER_MINUTE, settings.SIGNUP_BURST_PER_IP)
+    try:
+        email = (await request.json()).get("email")
+    except Exception:
+        email = None # El cuerpo inválido lo rechaza la validación normal
+    if isinstance(email, str):
+        await enforce(
+            "signup_email", email.strip().lower(),
+            settings.SIGNUP_RATE_PER_EMAIL_PER_MINUTE, settings.SIGNUP_BURST_PER_EMAIL,
+        )
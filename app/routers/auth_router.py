@@ -1,15 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
 
 from app.models import Token, UserRead # UserRead para el tipo de retorno de /me
-from app.security import create_access_token, verify_password
-from app.dependencies import get_db, get_current_active_user
+from app.security import create_access_token, verify_and_update_password_async
+from app.deadlines import DeadlineRoute
+from app.dependencies import get_db, get_current_active_user, user_cache
+from app.metrics import password_rehashed_total
+from app.rate_limit import limit_login
 from app.models import UserInDB # Para el tipado
 
-router = APIRouter()
+router = APIRouter(route_class=DeadlineRoute)
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(limit_login)])
 async def login_for_access_token(
     db: AsyncIOMotorDatabase = Depends(get_db),
     form_data: OAuth2PasswordRequestForm = Depends()
@@ -24,7 +28,8 @@ async def login_for_access_token(
     
     user = UserInDB(**user_doc) # Convertir doc a modelo Pydantic
 
-    if not verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o contraseña incorrectos",
@@ -32,6 +37,17 @@ async def login_for_access_token(
         )
     if not user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usuario inactivo")
+    if new_hash:
+        # El hash guardado usa otro esquema o coste: se reemplaza sin pedir nada al usuario.
+        # Solo si nadie cambió la contraseña mientras tanto; un fallo aquí no impide el login.
+        try:
+            await db.users.update_one(
+                {"_id": user.id, "hashed_password": user.hashed_password}, {"$set": {"hashed_password": new_hash}}
+            )
+            user_cache.pop(str(user.id))
+            password_rehashed_total.inc()
+        except PyMongoError as e:
+            print(f"No se pudo actualizar el hash de la contraseña: {e}")
     
     access_token = create_access_token(data={"sub": str(user.id)}) # user.id es el _id
     return {"access_token": access_token, "token_type": "bearer"}
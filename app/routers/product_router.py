@@ -107,27 +107,349 @@
 
 
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+import pymongo
+from pymongo import UpdateOne
 
-from app.dependencies import get_db, get_current_active_user
-from app.models import ProductCreate, ProductRead, ProductUpdate, ProductInDB, UserInDB
+from app.autocomplete import suggest_index, tokenize
+from app.batch_loader import BatchLoader
+from app.bulk_import import import_products, iter_csv_rows, iter_ndjson_rows
+from app.cache import TTLCache, etag_matches, make_etag
+from app.change_feed import product_feed
+from app.config import settings
+from app.deadlines import DeadlineRoute
+from app.dependencies import get_db, get_current_active_user, get_product_read_db
+from app.export import (
+    EXPORT_MEDIA_TYPES, EXPORT_PROJECTION, UPDATED_AT_FIELD, clamp_snapshot, export_stream, format_datetime,
+    snapshot_query, utc_now
+)
+from app.images import (
+    IMAGE_FIELD, IMAGE_SIGNATURES, delete_image_files, generate_thumbnails, image_version, parse_range, store_image,
+    stream_image
+)
+from app.metrics import register_cache
+from app.models import (
+    BulkImportResult, ProductBatch, ProductCreate, ProductFacets, ProductRead, ProductSuggestion, ProductUpdate,
+    ProductPage, StockAdjustRequest, StockAdjustResult, UserInDB
+)
+from app.pagination import clamp_page_size, fetch_page, fetch_text_page
+from app.serialization import (
+    PRODUCT_FIELDS, fields_description, json_bytes, json_response, page_public, product_public, public_doc, select_fields
+)
+from app.view_counter import VIEWS_FIELD, view_counter
 
-router = APIRouter()
+router = APIRouter(route_class=DeadlineRoute)
 PRODUCT_COLLECTION = "products"
+STOCK_OPS_FIELD = "_stock_ops" # Últimos ajustes aplicados, para saber qué líneas entraron
+STOCK_OPS_KEPT = 50
 
-@router.get("/", response_model=List[ProductRead])
-async def list_products(db: AsyncIOMotorDatabase = Depends(get_db)):
-    cursor = db[PRODUCT_COLLECTION].find()
-    results = []
-    async for doc in cursor:
-        product = ProductInDB(**doc)
-        dump = product.model_dump()
-        dump["id"] = str(dump.pop("id"))
-        results.append(dump)
-    return results
+# Caché de lectura por id: guarda (etag, cuerpo JSON, dict público) ya serializado
+product_cache = TTLCache(maxsize=settings.PRODUCT_CACHE_SIZE, ttl=settings.PRODUCT_CACHE_TTL_SECONDS)
+# Facetas por combinación de filtros; cualquier escritura las invalida
+facet_cache = TTLCache(maxsize=settings.FACET_CACHE_SIZE, ttl=settings.FACET_CACHE_TTL_SECONDS)
+FACET_TAGS_LIMIT = 50
+# Sugerencias por consulta normalizada; TTL corto porque el orden depende de stock y visitas
+suggest_cache = TTLCache(maxsize=settings.SUGGEST_CACHE_SIZE, ttl=settings.SUGGEST_CACHE_TTL_SECONDS)
+register_cache("product", product_cache)
+register_cache("facet", facet_cache)
+register_cache("suggest", suggest_cache)
+
+# Campos que cambian las facetas o las sugerencias; el resto (stock, imagen,
+# descripción...) solo invalida el producto y las facetas se ponen al día con
+# su TTL, igual que en los demás workers
+FACET_FIELDS = {"category", "tags", "price", "currency"}
+SUGGEST_FIELDS = {"name", "category", "tags"}
+
+# Invalidaciones ocurridas mientras hay cargas en curso (id -> generación): una
+# carga que leyó antes de la invalidación no debe volver a guardar el valor viejo.
+# Solo se anotan con cargas en vuelo, así que el dict no crece sin límite.
+_cache_generation = 0
+_invalidated_at: Dict[str, int] = {}
+_loads_in_flight = 0
+
+def invalidate_product_caches(*product_ids: str, facets: bool = True, suggestions: bool = True) -> None:
+    global _cache_generation
+    _cache_generation += 1
+    for product_id in product_ids:
+        product_cache.pop(product_id)
+        if _loads_in_flight:
+            _invalidated_at[product_id] = _cache_generation
+    if facets:
+        facet_cache.clear()
+    if suggestions:
+        suggest_cache.clear()
+
+async def load_products(product_ids: List[str]) -> dict:
+    # Una sola consulta $in para todo el lote; cada producto queda en la caché de lectura.
+    # Se lee del primario: un secundario con retraso devolvería lo que una
+    # escritura acaba de invalidar y quedaría cacheado durante todo el TTL.
+    # El lote es compartido: se acota con el plazo por defecto y no con el de la
+    # petición que lo abrió (un cliente con 1 ms haría fallar a todos los demás)
+    global _loads_in_flight
+    db = await get_db()
+    loaded = {}
+    started_at = _cache_generation
+    _loads_in_flight += 1
+    try:
+        with pymongo.timeout(settings.REQUEST_DEADLINE_MS / 1000 or None):
+            async for product_doc in db[PRODUCT_COLLECTION].find({"_id": {"$in": [ObjectId(pid) for pid in product_ids]}}):
+                product_id = str(product_doc["_id"])
+                public = product_public(product_doc)
+                body = json_bytes(public)
+                entry = (make_etag(body), body, public)
+                if _invalidated_at.get(product_id, started_at) <= started_at:
+                    product_cache.set(product_id, entry)
+                loaded[product_id] = entry
+    finally:
+        _loads_in_flight -= 1
+        if not _loads_in_flight:
+            _invalidated_at.clear()
+    return loaded
+
+# Búsquedas concurrentes de los mismos ids (p. ej. un producto en oferta) comparten consulta
+product_loader = BatchLoader(
+    load_products, settings.PRODUCT_LOADER_WINDOW_MS / 1000, settings.PRODUCT_LOADER_MAX_BATCH
+)
+
+async def warm_product_cache(db: AsyncIOMotorDatabase, limit: int) -> int:
+    # Precarga los productos más recientes para que las primeras lecturas
+    # tras un reinicio no paguen el viaje a Mongo ni la serialización
+    loaded = 0
+    async for product_doc in db[PRODUCT_COLLECTION].find().sort("_id", -1).limit(limit):
+        public = product_public(product_doc)
+        body = json_bytes(public)
+        product_cache.set(str(product_doc["_id"]), (make_etag(body), body, public))
+        loaded += 1
+    return loaded
+
+def get_product_filter(
+    category: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    tags_match: str = Query("any", pattern="^(any|all)$"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: Optional[bool] = None,
+    currency: Optional[str] = None,
+    q: Optional[str] = Query(None, min_length=1, max_length=100)
+) -> dict:
+    # Filtro Mongo compartido por los endpoints de catálogo
+    query = {}
+    if category:
+        query["category"] = category
+    if tags:
+        query["tags"] = {"$all" if tags_match == "all" else "$in": tags}
+    if min_price is not None or max_price is not None:
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_price no puede ser mayor que max_price")
+        query["price"] = {}
+        if min_price is not None:
+            query["price"]["$gte"] = min_price
+        if max_price is not None:
+            query["price"]["$lte"] = max_price
+    if in_stock is True:
+        query["stock"] = {"$gt": 0}
+    elif in_stock is False:
+        query["stock"] = 0
+    if currency:
+        query["currency"] = currency
+    if q:
+        query["$text"] = {"$search": q}
+    return query
+
+@router.get("/", response_model=ProductPage)
+async def list_products(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    sort: Optional[str] = Query(None, pattern="^(-?(price|name)|popular)$"),
+    fields: Optional[str] = Query(None, description=fields_description("name,price")),
+    query: dict = Depends(get_product_filter),
+    db: AsyncIOMotorDatabase = Depends(get_product_read_db)
+):
+    limit = clamp_page_size(limit)
+    selected, projection = select_fields(fields, PRODUCT_FIELDS)
+    if "$text" in query and sort is None:
+        # Búsqueda por texto sin orden explícito: ordenar por relevancia
+        docs, next_cursor = await fetch_text_page(db[PRODUCT_COLLECTION], query, cursor, limit, projection)
+    else:
+        # Paginación por (campo de orden, _id): cada página cuesta lo mismo sin importar su profundidad
+        sort_field, direction = None, 1
+        if sort == "popular":
+            sort_field, direction = VIEWS_FIELD, -1 # Más vistos primero
+        elif sort:
+            sort_field, direction = sort.lstrip("-"), (-1 if sort.startswith("-") else 1)
+        if sort_field and projection is not None:
+            projection[sort_field] = 1 # El cursor necesita el valor del campo de orden
+        docs, next_cursor = await fetch_page(
+            db[PRODUCT_COLLECTION], query, cursor, limit,
+            sort_field=sort_field, direction=direction, projection=projection
+        )
+    return json_response(page_public(docs, next_cursor, selected))
+
+@router.get("/facets", response_model=ProductFacets)
+async def read_product_facets(
+    buckets: int = Query(10, ge=1, le=50),
+    query: dict = Depends(get_product_filter),
+    db: AsyncIOMotorDatabase = Depends(get_product_read_db)
+):
+    cache_key = json.dumps([query, buckets], sort_keys=True, default=str)
+    cached = facet_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Una sola agregación calcula todas las facetas sobre el mismo $match
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "categories": [
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ],
+            "tags": [
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": FACET_TAGS_LIMIT},
+            ],
+            "price": [{"$group": {"_id": None, "min": {"$min": "$price"}, "max": {"$max": "$price"}}}],
+            "price_histogram": [{"$bucketAuto": {"groupBy": "$price", "buckets": buckets}}],
+        }},
+    ]
+    result = (await db[PRODUCT_COLLECTION].aggregate(pipeline).to_list(length=1))[0]
+    price = result["price"][0] if result["price"] else {}
+    facets = {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "categories": [{"value": str(item["_id"]), "count": item["count"]} for item in result["categories"]],
+        "tags": [{"value": str(item["_id"]), "count": item["count"]} for item in result["tags"]],
+        "price_min": price.get("min"),
+        "price_max": price.get("max"),
+        "price_histogram": [
+            {"min": item["_id"]["min"], "max": item["_id"]["max"], "count": item["count"]}
+            for item in result["price_histogram"]
+        ],
+    }
+    facet_cache.set(cache_key, facets)
+    return facets
+
+@router.get("/stream")
+async def stream_product_changes(
+    category: Optional[str] = None,
+    tags: Optional[List[str]] = Query(None),
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_product_read_db)
+):
+    # Server-Sent Events con los cambios del catálogo; todos los clientes
+    # comparten el mismo change stream de Mongo. Con filtro, un producto que
+    # deja de coincidir (cambio de categoría o etiquetas) llega como "leave"
+    product_feed.start(db[PRODUCT_COLLECTION])
+    if not product_feed.available:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Feed de cambios no disponible")
+    subscription = product_feed.subscribe(category, tags, last_event_id)
+
+    async def event_stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), timeout=settings.SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n" # Mantiene viva la conexión a través de proxies
+                    continue
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            product_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/export")
+async def export_products(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="Comprimir la respuesta con gzip"),
+    updated_since: Optional[datetime] = Query(None, description="Solo productos escritos después de esta fecha"),
+    as_of: Optional[datetime] = Query(None, description="Punto de corte; por defecto y como máximo, ahora"),
+    query: dict = Depends(get_product_filter),
+    db: AsyncIOMotorDatabase = Depends(get_product_read_db),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    # El catálogo completo se envía a medida que se lee del cursor.
+    # X-Export-Snapshot es el valor a usar como updated_since en la siguiente exportación.
+    as_of = clamp_snapshot(as_of)
+    cursor = (
+        db[PRODUCT_COLLECTION]
+        .find(snapshot_query(query, as_of, updated_since), EXPORT_PROJECTION)
+        .sort("_id", 1)
+        .batch_size(settings.EXPORT_BATCH_SIZE)
+    )
+    headers = {
+        "Content-Disposition": f'attachment; filename="products.{fmt}"',
+        "Cache-Control": "no-store",
+        "X-Export-Snapshot": format_datetime(as_of),
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(export_stream(cursor, fmt, gzip), media_type=EXPORT_MEDIA_TYPES[fmt], headers=headers)
+
+@router.get("/batch", response_model=ProductBatch)
+async def read_products_batch(
+    ids: List[str] = Query(..., description="Ids separados por coma o repetidos, ej. ids=a,b&ids=c"),
+    fields: Optional[str] = Query(None, description=fields_description("name,price"))
+):
+    requested = list(dict.fromkeys(pid.strip() for raw in ids for pid in raw.split(",") if pid.strip()))
+    if len(requested) > settings.PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {settings.PRODUCT_BATCH_MAX_IDS} ids por consulta"
+        )
+    selected, projection = select_fields(fields, PRODUCT_FIELDS)
+    normalized = {pid: str(ObjectId(pid)) for pid in requested if ObjectId.is_valid(pid)}
+
+    found = {}
+    missing = []
+    for product_id in dict.fromkeys(normalized.values()):
+        cached = product_cache.get(product_id)
+        if cached is not None:
+            found[product_id] = cached[2]
+        else:
+            missing.append(product_id)
+    if missing:
+        for product_id, entry in (await product_loader.load_many(missing)).items():
+            if entry is not None:
+                found[product_id] = entry[2]
+
+    items, not_found = [], []
+    for pid in requested:
+        public = found.get(normalized.get(pid))
+        if public is None:
+            not_found.append(pid)
+        else:
+            items.append(public if projection is None else public_doc(public, selected))
+    return json_response({"items": items, "not_found": not_found})
+
+@router.get("/suggest", response_model=List[ProductSuggestion])
+async def suggest_products(
+    q: str = Query(..., min_length=1, max_length=100, description="Texto escrito hasta ahora"),
+    limit: int = Query(8, ge=1, le=20)
+):
+    # Se responde desde el índice en memoria, sin consultar Mongo
+    cache_key = (" ".join(tokenize(q)), limit)
+    body = suggest_cache.get(cache_key)
+    if body is None:
+        body = json_bytes(suggest_index.suggest(q, limit))
+        suggest_cache.set(cache_key, body)
+    return Response(content=body, media_type="application/json")
 
 @router.post("/", response_model=ProductRead, status_code=status.HTTP_201_CREATED)
 async def create_new_product(
@@ -136,26 +458,214 @@ async def create_new_product(
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     # Solo usuarios autenticados pueden crear productos
-    db_product = ProductInDB(**product_in.model_dump())
-    product_doc_to_insert = db_product.model_dump(by_alias=True, exclude_none=True)
+    product_doc_to_insert = {
+        "_id": ObjectId(), **product_in.model_dump(exclude_none=True), VIEWS_FIELD: 0, UPDATED_AT_FIELD: utc_now()
+    }
+
+    await db[PRODUCT_COLLECTION].insert_one(product_doc_to_insert)
+    suggest_index.upsert(product_doc_to_insert)
+    invalidate_product_caches()
+    return json_response(product_public(product_doc_to_insert), status_code=status.HTTP_201_CREATED)
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_import_products(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    # Cuerpo NDJSON (un producto por línea) o CSV con cabecera; tags separados por "|"
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    if format == "csv":
+        rows = iter_csv_rows(request.stream())
+    else:
+        rows = iter_ndjson_rows(request.stream())
+    summary = await import_products(db[PRODUCT_COLLECTION], rows, on_inserted=suggest_index.upsert)
+    invalidate_product_caches()
+    return summary
 
-    result = await db[PRODUCT_COLLECTION].insert_one(product_doc_to_insert)
-    created_doc = await db[PRODUCT_COLLECTION].find_one({"_id": result.inserted_id})
-    if not created_doc:
-        raise HTTPException(status_code=500, detail="Error al crear producto")
-    return ProductRead(**created_doc)
+@router.post("/stock/adjust", response_model=StockAdjustResult)
+async def adjust_stock(
+    adjust_in: StockAdjustRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    # Sumar líneas repetidas del mismo producto: un $inc por producto
+    deltas = {}
+    for item in adjust_in.items:
+        product_id = str(ObjectId(item.product_id))
+        deltas[product_id] = deltas.get(product_id, 0) + item.delta
+
+    # Cada $inc negativo solo aplica si queda stock suficiente. Se marca el
+    # documento con el id de esta operación para poder distinguir después
+    # qué líneas se aplicaron si alguna no coincide.
+    op_id = ObjectId()
+    now = utc_now()
+    operations = []
+    for product_id, delta in deltas.items():
+        query = {"_id": ObjectId(product_id)}
+        if delta < 0:
+            query["stock"] = {"$gte": -delta}
+        operations.append(UpdateOne(query, {
+            "$inc": {"stock": delta},
+            "$set": {UPDATED_AT_FIELD: now},
+            "$push": {STOCK_OPS_FIELD: {"$each": [op_id], "$slice": -STOCK_OPS_KEPT}},
+        }))
+    result = await db[PRODUCT_COLLECTION].bulk_write(operations, ordered=False)
+
+    if result.matched_count == len(operations):
+        applied, rejected = list(deltas), []
+    else:
+        # Solo en fallos parciales: una lectura para clasificar cada línea
+        found = {
+            str(doc["_id"]): op_id in doc.get(STOCK_OPS_FIELD, [])
+            async for doc in db[PRODUCT_COLLECTION].find(
+                {"_id": {"$in": [ObjectId(product_id) for product_id in deltas]}},
+                {STOCK_OPS_FIELD: 1}
+            )
+        }
+        applied, rejected = [], []
+        for product_id in deltas:
+            if found.get(product_id):
+                applied.append(product_id)
+            else:
+                reason = "insufficient_stock" if product_id in found else "not_found"
+                rejected.append({"product_id": product_id, "reason": reason})
+
+    for product_id in applied:
+        suggest_index.adjust_stock(product_id, deltas[product_id])
+    invalidate_product_caches(*applied, facets=False, suggestions=False)
+    return {"applied": applied, "rejected": rejected}
 
 @router.get("/{product_id}", response_model=ProductRead)
 async def read_product_by_id(
     product_id: str,
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    fields: Optional[str] = Query(None, description=fields_description("name,price")),
+    db: AsyncIOMotorDatabase = Depends(get_product_read_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de producto inválido")
+    product_id = str(ObjectId(product_id)) # Normalizar para la clave de caché
+    selected, projection = select_fields(fields, PRODUCT_FIELDS)
+    cached = product_cache.get(product_id) # Producto completo en caché: se responde tal cual
+    category = cached[2].get("category") if cached is not None else None
+    if cached is not None and projection is not None:
+        # Subconjunto de campos a partir del producto ya cacheado
+        body = json_bytes(public_doc(cached[2], selected))
+        cached = (make_etag(body), body, None)
+    elif cached is None and projection is None:
+        # Producto completo sin caché: lecturas simultáneas del mismo id comparten la consulta (y lo cachean)
+        cached = (await product_loader.load_many([product_id]))[product_id]
+        if cached is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
+        category = cached[2].get("category")
+    elif cached is None:
+        projection["category"] = 1 # Para el contador de visitas por categoría
+        product_doc = await db[PRODUCT_COLLECTION].find_one({"_id": ObjectId(product_id)}, projection)
+        if not product_doc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
+        body = json_bytes(public_doc(product_doc, selected))
+        cached = (make_etag(body), body, None)
+        category = product_doc.get("category")
+
+    # Se cuenta en memoria; el flush periódico lo escribe en bloque
+    view_counter.record(product_id, category)
+    suggest_index.add_view(product_id)
+    etag, body, _ = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.post("/{product_id}/image", response_model=ProductRead)
+async def upload_product_image(
+    product_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    content_type: str = Header(...),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_active_user)
 ):
+    # El cuerpo es la imagen tal cual (no multipart), con su Content-Type
     if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de producto inválido")
-    product_doc = await db[PRODUCT_COLLECTION].find_one({"_id": ObjectId(product_id)})
-    if not product_doc:
+    product_id = str(ObjectId(product_id))
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type not in IMAGE_SIGNATURES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Tipo de imagen no soportado; usa uno de: {', '.join(IMAGE_SIGNATURES)}"
+        )
+    previous = await db[PRODUCT_COLLECTION].find_one({"_id": ObjectId(product_id)}, {IMAGE_FIELD: 1})
+    if not previous:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
+
+    image = await store_image(db, product_id, media_type, request.stream())
+    # La versión en la URL permite cachear la imagen indefinidamente
+    image_url = f"{request.app.url_path_for('read_product_image', product_id=product_id)}?v={image_version(image)}"
+    updated_doc = await db[PRODUCT_COLLECTION].find_one_and_update(
+        {"_id": ObjectId(product_id)},
+        {"$set": {"image_url": image_url, IMAGE_FIELD: image, UPDATED_AT_FIELD: utc_now()}},
+        return_document=True
+    )
+    if not updated_doc:
+        await delete_image_files(db, image)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
-    return ProductRead(**product_doc)
+    suggest_index.upsert(updated_doc)
+    invalidate_product_caches(product_id, facets=False, suggestions=False)
+
+    background_tasks.add_task(generate_thumbnails, db, PRODUCT_COLLECTION, product_id, image["file_id"])
+    if previous.get(IMAGE_FIELD):
+        background_tasks.add_task(delete_image_files, db, previous[IMAGE_FIELD])
+    return json_response(product_public(updated_doc))
+
+@router.get("/{product_id}/image", name="read_product_image")
+async def read_product_image(
+    product_id: str,
+    size: Optional[int] = Query(None, ge=1, description="Lado de la miniatura; sin él se sirve el original"),
+    v: Optional[str] = Query(None, description="Versión de la imagen (la que trae image_url)"),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncIOMotorDatabase = Depends(get_product_read_db)
+):
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de producto inválido")
+    product_doc = await db[PRODUCT_COLLECTION].find_one({"_id": ObjectId(product_id)}, {IMAGE_FIELD: 1})
+    if not product_doc or not product_doc.get(IMAGE_FIELD):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Imagen no encontrada")
+
+    image = product_doc[IMAGE_FIELD]
+    # Solo la URL con la versión vigente puede fijarse en caché para siempre; la
+    # URL sin versión (o con una vieja) sirve lo actual y se revalida con el ETag
+    if v is not None and v == image_version(image):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "no-cache"
+    if size is not None:
+        thumbnail = image.get("thumbnails", {}).get(str(size))
+        if thumbnail:
+            image = thumbnail
+        else:
+            cache_control = "no-cache" # Miniatura aún no generada: se sirve el original sin fijarlo en caché
+    etag = f'"{image["etag"]}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    length = image["length"]
+    byte_range = parse_range(range_header, length)
+    start, end = byte_range or (0, length - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    return StreamingResponse(
+        stream_image(db, image["file_id"], start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=image["content_type"],
+        headers=headers,
+    )
 
 @router.put("/{product_id}", response_model=ProductRead)
 async def update_existing_product(
@@ -171,12 +681,18 @@ async def update_existing_product(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No hay datos para actualizar")
     updated_doc = await db[PRODUCT_COLLECTION].find_one_and_update(
         {"_id": ObjectId(product_id)},
-        {"$set": update_data},
+        {"$set": {**update_data, UPDATED_AT_FIELD: utc_now()}},
         return_document=True
     )
+    invalidate_product_caches(
+        str(ObjectId(product_id)),
+        facets=not FACET_FIELDS.isdisjoint(update_data),
+        suggestions=not SUGGEST_FIELDS.isdisjoint(update_data),
+    )
     if not updated_doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado para actualizar")
-    return ProductRead(**updated_doc)
+    suggest_index.upsert(updated_doc)
+    return json_response(product_public(updated_doc))
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_existing_product(
@@ -186,7 +702,13 @@ async def delete_existing_product(
 ):
     if not ObjectId.is_valid(product_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de producto inválido")
-    delete_result = await db[PRODUCT_COLLECTION].delete_one({"_id": ObjectId(product_id)})
-    if delete_result.deleted_count == 0:
+    deleted_doc = await db[PRODUCT_COLLECTION].find_one_and_delete(
+        {"_id": ObjectId(product_id)}, projection={IMAGE_FIELD: 1}
+    )
+    invalidate_product_caches(str(ObjectId(product_id)))
+    suggest_index.remove(str(ObjectId(product_id)))
+    if not deleted_doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado para eliminar")
+    if deleted_doc.get(IMAGE_FIELD):
+        await delete_image_files(db, deleted_doc[IMAGE_FIELD])
     return
@@ -1,28 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
-from app.dependencies import get_db, get_current_active_superuser, get_current_active_user
-from app.models import UserCreate, UserRead, UserUpdate, UserInDB
-from app.security import get_password_hash
+from app.deadlines import DeadlineRoute
+from app.dependencies import get_db, get_current_active_superuser, get_current_active_user, user_cache
+from app.models import UserCreate, UserRead, UserUpdate, UserInDB, UserPage
+from app.pagination import clamp_page_size, fetch_page
+from app.rate_limit import limit_signup
+from app.serialization import (
+    USER_FIELDS, fields_description, json_response, page_public, public_doc, select_fields, user_public
+)
+from app.security import get_password_hash_async
 
-router = APIRouter()
+router = APIRouter(route_class=DeadlineRoute)
 USER_COLLECTION = "users"
 
-@router.post("/", response_model=UserRead, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=UserRead, status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_signup)])
 async def create_new_user(
     user_in: UserCreate,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    existing_user = await db[USER_COLLECTION].find_one({"email": user_in.email})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ya existe un usuario con este email."
-        )
-    
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await get_password_hash_async(user_in.password)
     # Crear UserInDB para asegurar todos los campos y generar _id si es necesario
     db_user = UserInDB(
         email=user_in.email,
@@ -33,28 +33,36 @@ async def create_new_user(
     # Convertir a dict para MongoDB, usando alias (ej: id a _id)
     user_doc_to_insert = db_user.model_dump(by_alias=True, exclude_none=True)
 
-    result = await db[USER_COLLECTION].insert_one(user_doc_to_insert)
-    
-    created_user_doc = await db[USER_COLLECTION].find_one({"_id": result.inserted_id})
-    if not created_user_doc:
-         raise HTTPException(status_code=500, detail="Error al crear usuario") # No debería pasar
-    return UserRead(**created_user_doc)
+    # El índice único sobre email rechaza duplicados sin consulta previa
+    try:
+        await db[USER_COLLECTION].insert_one(user_doc_to_insert)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya existe un usuario con este email."
+        )
+    return json_response(user_public(user_doc_to_insert), status_code=status.HTTP_201_CREATED)
 
 
-@router.get("/", response_model=List[UserRead], dependencies=[Depends(get_current_active_superuser)])
+@router.get("/", response_model=UserPage, dependencies=[Depends(get_current_active_superuser)])
 async def read_all_users(
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = Query(None, description=fields_description("email,full_name")),
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    users_cursor = db[USER_COLLECTION].find().skip(skip).limit(limit)
-    user_docs = await users_cursor.to_list(length=limit)
-    return [UserRead(**doc) for doc in user_docs]
+    selected, projection = select_fields(fields, USER_FIELDS)
+    # Cursor sobre _id en lugar de skip/limit
+    user_docs, next_cursor = await fetch_page(
+        db[USER_COLLECTION], {}, cursor, clamp_page_size(limit), projection=projection
+    )
+    return json_response(page_public(user_docs, next_cursor, selected))
 
 
 @router.get("/{user_id}", response_model=UserRead)
 async def read_user_by_id(
     user_id: str,
+    fields: Optional[str] = Query(None, description=fields_description("email,full_name")),
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: UserInDB = Depends(get_current_active_user) # Asegurar que está logueado
 ):
@@ -65,10 +73,11 @@ async def read_user_by_id(
     if str(current_user.id) != user_id and not current_user.is_superuser:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No autorizado para ver este usuario")
 
-    user_doc = await db[USER_COLLECTION].find_one({"_id": ObjectId(user_id)})
+    selected, projection = select_fields(fields, USER_FIELDS)
+    user_doc = await db[USER_COLLECTION].find_one({"_id": ObjectId(user_id)}, projection)
     if not user_doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado")
-    return UserRead(**user_doc)
+    return json_response(public_doc(user_doc, selected))
 
 
 @router.put("/{user_id}", response_model=UserRead)
@@ -80,6 +89,7 @@ async def update_existing_user(
 ):
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de usuario inválido")
+    user_id = str(ObjectId(user_id)) # Normalizar: es la clave de la caché de usuarios
 
     # Un usuario solo puede actualizar su propio perfil, o un superusuario puede actualizar cualquiera
     if str(current_user.id) != user_id and not current_user.is_superuser:
@@ -87,18 +97,26 @@ async def update_existing_user(
 
     update_data = user_in.model_dump(exclude_unset=True)
     if "password" in update_data and update_data["password"]: # Si se provee nueva contraseña
-        update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+        update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
     
     if not update_data:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No hay datos para actualizar")
 
-    updated_user_doc = await db[USER_COLLECTION].find_one_and_update(
-        {"_id": ObjectId(user_id)},
-        {"$set": update_data},
-        return_document=True 
-    )
+    try:
+        updated_user_doc = await db[USER_COLLECTION].find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$set": update_data},
+            return_document=True 
+        )
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya existe un usuario con este email."
+        )
+    # Invalidar la caché para que desactivaciones o cambios de permisos se apliquen ya
+    user_cache.pop(user_id)
     if not updated_user_doc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuario no encontrado para actualizar")
-    return UserRead(**updated_user_doc)
+    return json_response(user_public(updated_user_doc))
 
 # Podrías añadir una ruta DELETE similar, probablemente solo para superusuarios.
\ No newline at end of file
@@ -1,19 +1,149 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.config import settings
+from app.metrics import (
+    password_hash_latency_seconds, password_hash_queue_depth, password_hash_rejected_total,
+    password_hash_seconds, register_collector,
+)
+from app.profiling import record_timing
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+HASH_SCHEMES = ("bcrypt", "argon2")
+
+def build_pwd_context(
+    scheme: str, bcrypt_rounds: int, argon2_time_cost: int, argon2_memory_cost_kib: int, argon2_parallelism: int
+) -> CryptContext:
+    # El esquema elegido va primero y es el único con el que se crean hashes;
+    # los demás solo verifican (deprecated="auto"). Fijar min y max de rondas
+    # hace que un hash con otro coste, mayor o menor, necesite actualizarse.
+    return CryptContext(
+        schemes=[scheme] + [other for other in HASH_SCHEMES if other != scheme],
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__max_rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost_kib,
+        argon2__parallelism=argon2_parallelism,
+    )
+
+pwd_context = build_pwd_context(
+    settings.PASSWORD_HASH_SCHEME, settings.BCRYPT_ROUNDS,
+    settings.ARGON2_TIME_COST, settings.ARGON2_MEMORY_COST_KIB, settings.ARGON2_PARALLELISM,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # (válida, hash nuevo): el hash nuevo solo viene si el guardado usa otro esquema o coste
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+# --- Pool de hashing fuera del event loop ---
+# bcrypt libera el GIL, así que un pool de hilos pequeño basta para que un
+# pico de logins no bloquee al resto de peticiones. La cola está acotada:
+# si se llena respondemos 503 en lugar de acumular trabajo.
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_pending = 0 # Tareas en cola o ejecutándose
+_hash_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "latency_seconds_total": 0.0, # Espera en cola + hash
+    "latency_seconds_max": 0.0,
+    "hash_seconds_total": 0.0, # Solo el tiempo de bcrypt
+}
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.HASH_POOL_WORKERS, thread_name_prefix="pwd-hash"
+        )
+    return _hash_executor
+
+def _timed_call(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def _release_hash_slot() -> None:
+    global _hash_pending
+    _hash_pending -= 1
+
+def _on_hash_job_done(loop, _job) -> None:
+    # Corre en el hilo del pool (o al cancelar un trabajo que aún no empezó)
+    try:
+        loop.call_soon_threadsafe(_release_hash_slot)
+    except RuntimeError:
+        pass # Loop ya cerrado (apagado)
+
+async def _run_in_hash_pool(fn, *args):
+    global _hash_pending
+    if _hash_pending >= settings.HASH_POOL_WORKERS + settings.HASH_QUEUE_MAX:
+        _hash_stats["rejected"] += 1
+        password_hash_rejected_total.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio de autenticación saturado, intenta de nuevo",
+            headers={"Retry-After": "1"},
+        )
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    job = _get_hash_executor().submit(_timed_call, fn, *args)
+    _hash_pending += 1
+    # El hueco se libera cuando el pool acaba el trabajo, no cuando la petición deja
+    # de esperarlo: si se cancela, el hash ya encolado sigue ocupando un worker
+    job.add_done_callback(functools.partial(_on_hash_job_done, loop))
+    result, hash_seconds = await asyncio.wrap_future(job)
+    latency = time.perf_counter() - start
+    _hash_stats["completed"] += 1
+    _hash_stats["latency_seconds_total"] += latency
+    _hash_stats["latency_seconds_max"] = max(_hash_stats["latency_seconds_max"], latency)
+    _hash_stats["hash_seconds_total"] += hash_seconds
+    password_hash_seconds.observe(hash_seconds, fn.__name__)
+    password_hash_latency_seconds.observe(latency, fn.__name__)
+    record_timing("hashing", latency)
+    return result
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _run_in_hash_pool(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hash_pool(get_password_hash, password)
+
+def hashing_stats() -> dict:
+    return {
+        "scheme": settings.PASSWORD_HASH_SCHEME,
+        "workers": settings.HASH_POOL_WORKERS,
+        "queue_max": settings.HASH_QUEUE_MAX,
+        "queue_depth": _hash_pending,
+        **_hash_stats,
+    }
+
+register_collector(lambda: password_hash_queue_depth.set(_hash_pending))
+
+def shutdown_hash_pool() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True)
+        _hash_executor = None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
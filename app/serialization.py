@@ -0,0 +1,90 @@
+from typing import Iterable, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from app.models import ProductRead, UserRead
+
+# --- Serialización directa de documentos de Mongo ---
+# Los documentos leídos de nuestra propia base ya pasaron validación al
+# escribirse, así que en las rutas de lectura no se reconstruyen modelos
+# Pydantic: se copian los campos públicos del modelo de respuesta y se
+# codifican a JSON con el encoder de pydantic-core. El response_model de cada
+# ruta se mantiene para la documentación OpenAPI.
+
+FieldSpec = Tuple[Tuple[str, object], ...] # (clave en el JSON/Mongo, valor por defecto)
+
+
+def public_fields(model: type[BaseModel]) -> FieldSpec:
+    fields = []
+    for name, field in model.model_fields.items():
+        default = None if field.is_required() else field.get_default(call_default_factory=True)
+        fields.append((field.alias or name, default))
+    return tuple(fields)
+
+
+PRODUCT_FIELDS = public_fields(ProductRead)
+USER_FIELDS = public_fields(UserRead)
+
+
+def fields_description(example: str) -> str:
+    # El response_model de la ruta documenta el objeto completo; con fields la
+    # respuesta es un subconjunto armado sin modelo Pydantic propio
+    return (
+        f"Campos a devolver separados por coma, ej. {example}. La respuesta solo trae esos campos "
+        "y _id: el esquema documentado es el del objeto completo."
+    )
+
+
+def select_fields(fields: Optional[str], spec: FieldSpec) -> Tuple[FieldSpec, Optional[dict]]:
+    """
+    Convierte ?fields=a,b en el subconjunto de campos a devolver y la
+    proyección de Mongo equivalente. _id siempre se incluye.
+    Sin fields devuelve el modelo completo y proyección None.
+    """
+    if not fields:
+        return spec, None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    requested = {"_id" if name == "id" else name for name in requested}
+    unknown = requested - {key for key, _ in spec}
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos desconocidos: {', '.join(sorted(unknown))}"
+        )
+    selected = tuple((key, default) for key, default in spec if key in requested or key == "_id")
+    return selected, {key: 1 for key, _ in selected}
+
+
+def public_doc(doc: dict, fields: FieldSpec) -> dict:
+    out = {}
+    for key, default in fields:
+        value = doc.get(key, default)
+        if isinstance(value, ObjectId):
+            value = str(value)
+        out[key] = value
+    return out
+
+
+def product_public(doc: dict) -> dict:
+    return public_doc(doc, PRODUCT_FIELDS)
+
+
+def user_public(doc: dict) -> dict:
+    return public_doc(doc, USER_FIELDS)
+
+
+def page_public(docs: Iterable[dict], next_cursor: Optional[str], fields: FieldSpec) -> dict:
+    return {"items": [public_doc(doc, fields) for doc in docs], "next_cursor": next_cursor}
+
+
+def json_bytes(content) -> bytes:
+    return to_json(content)
+
+
+def json_response(content, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    return Response(
+        content=to_json(content), status_code=status_code, headers=headers, media_type="application/json"
+    )
@@ -0,0 +1,39 @@
+import os
+from importlib.util import find_spec
+
+import uvicorn
+
+from app.config import settings
+
+# --- Punto de entrada de producción ---
+# python -m app.server
+# Lanza N workers de uvicorn (uno por CPU por defecto) con uvloop/httptools
+# si están instalados. Cada worker ejecuta el lifespan completo (ping, índices,
+# calentamiento) antes de aceptar tráfico. Con SIGTERM uvicorn deja de aceptar
+# conexiones y espera a las peticiones en curso hasta
+# SERVER_GRACEFUL_TIMEOUT_SECONDS antes de cerrar.
+
+
+def worker_count() -> int:
+    if settings.SERVER_WORKERS:
+        return settings.SERVER_WORKERS
+    return os.cpu_count() or 1
+
+
+def main() -> None:
+    uvicorn.run(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=worker_count(),
+        loop="uvloop" if find_spec("uvloop") else "asyncio",
+        http="httptools" if find_spec("httptools") else "h11",
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        proxy_headers=True,
+        access_log=False, # Las métricas por ruta ya están en /api/v1/metrics
+    )
+
+
+if __name__ == "__main__":
+    main()
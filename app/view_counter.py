@@ -0,0 +1,115 @@
+import asyncio
+from collections import Counter
+from typing import Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.config import settings
+from app.metrics import Counter as MetricCounter, Gauge, register_collector
+
+# --- Contadores de visitas con escritura diferida ---
+# Cada lectura de un producto solo suma en memoria; un flush periódico (o al
+# llegar al umbral) aplica los acumulados con un bulk_write desordenado por
+# colección, en vez de un $inc por visita.
+
+VIEWS_FIELD = "views" # Visitas acumuladas en el documento del producto
+CATEGORY_STATS_COLLECTION = "category_stats"
+
+product_views_flushed_total = MetricCounter("product_views_flushed_total", "Visitas de productos escritas en MongoDB")
+product_views_pending = Gauge("product_views_pending", "Visitas contadas en memoria pendientes de escribir")
+
+
+class ViewCounter:
+    def __init__(self, products_collection: str, flush_interval: float, flush_threshold: int):
+        self.products_collection = products_collection
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._products: Counter = Counter()
+        self._categories: Counter = Counter()
+        self._pending = 0
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._task: Optional[asyncio.Task] = None
+        self._threshold_flush: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._stats = {"flushes": 0, "flushed_views": 0, "failed_flushes": 0}
+
+    def start(self, db: AsyncIOMotorDatabase) -> None:
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush() # Lo que quede en memoria no se pierde al apagar
+
+    def record(self, product_id: str, category: Optional[str]) -> None:
+        self._products[product_id] += 1
+        if category:
+            self._categories[category] += 1
+        self._pending += 1
+        if self._pending >= self.flush_threshold and self._db is not None and (
+            self._threshold_flush is None or self._threshold_flush.done()
+        ):
+            self._threshold_flush = asyncio.create_task(self.flush())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if self._db is None or not self._products:
+                return 0
+            products, categories, pending = self._products, self._categories, self._pending
+            self._products, self._categories, self._pending = Counter(), Counter(), 0
+            try:
+                await self._db[self.products_collection].bulk_write(
+                    [UpdateOne({"_id": ObjectId(pid)}, {"$inc": {VIEWS_FIELD: n}}) for pid, n in products.items()],
+                    ordered=False,
+                )
+                if categories:
+                    await self._db[CATEGORY_STATS_COLLECTION].bulk_write(
+                        [UpdateOne({"_id": cat}, {"$inc": {VIEWS_FIELD: n}}, upsert=True) for cat, n in categories.items()],
+                        ordered=False,
+                    )
+            except BulkWriteError as e:
+                # Errores por documento (no de conexión): esas visitas se descartan
+                self._stats["failed_flushes"] += 1
+                print(f"Error parcial al guardar visitas: {e.details.get('writeErrors', [])[:3]}")
+            except PyMongoError as e:
+                # No se sabe qué se aplicó: se devuelven a memoria para el próximo flush
+                self._products.update(products)
+                self._categories.update(categories)
+                self._pending += pending
+                self._stats["failed_flushes"] += 1
+                print(f"Error al guardar visitas, se reintentará: {e}")
+                return 0
+            self._stats["flushes"] += 1
+            self._stats["flushed_views"] += pending
+            product_views_flushed_total.inc(amount=pending)
+            return pending
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending_views": self._pending, "pending_products": len(self._products)}
+
+
+async def backfill_view_counts(db: AsyncIOMotorDatabase, products_collection: str) -> int:
+    # El orden por popularidad pagina con (views, _id): todo producto necesita el campo
+    result = await db[products_collection].update_many(
+        {VIEWS_FIELD: {"$exists": False}}, {"$set": {VIEWS_FIELD: 0}}
+    )
+    return result.modified_count
+
+
+view_counter = ViewCounter("products", settings.VIEW_FLUSH_INTERVAL_SECONDS, settings.VIEW_FLUSH_THRESHOLD)
+register_collector(lambda: product_views_pending.set(view_counter.stats()["pending_views"]))
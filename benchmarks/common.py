@@ -0,0 +1,108 @@
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+from datetime import datetime, timezone
+
+# Valores por defecto para poder importar app.config sin un .env
+BENCH_ENV = {
+    "PROJECT_NAME": "AgroRed Bench",
+    "MONGO_URI": "mongodb://localhost:27017",
+    "MONGO_DB_NAME": "agrored_bench",
+    "SECRET_KEY": "bench-secret-key",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "RATE_LIMIT_ENABLED": "false", # Todas las peticiones llegan desde el mismo "cliente"
+}
+for key, value in BENCH_ENV.items():
+    os.environ.setdefault(key, value)
+
+BENCH_PASSWORD = "bench-password"
+CATEGORIES = ["frutas", "verduras", "lacteos", "granos", "carnes", "hierbas"]
+TAGS = ["organico", "local", "temporada", "oferta", "premium", "granel", "fresco"]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: list) -> dict:
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+    }
+
+
+def random_product(rng: random.Random, i: int) -> dict:
+    return {
+        "name": f"Producto {i:07d}",
+        "description": "Producto de prueba para benchmarks. " * rng.randint(1, 10),
+        "price": round(rng.uniform(500, 200000), 2),
+        "currency": "COP",
+        "stock": rng.randint(0, 500),
+        "category": rng.choice(CATEGORIES),
+        "tags": rng.sample(TAGS, rng.randint(0, 3)),
+    }
+
+
+def environment_info() -> dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def save_results(path: str, results: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {path}")
+
+
+def compare_with_baseline(results: dict, baseline_path: str, tolerance: float) -> list:
+    """
+    Compara cada métrica "*_ms" (menor es mejor) y "throughput_rps" (mayor es
+    mejor) con el baseline. Devuelve la lista de regresiones que superan la
+    tolerancia relativa.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = []
+
+    def walk(current, previous, path):
+        if isinstance(current, dict) and isinstance(previous, dict):
+            for key, value in current.items():
+                if key in previous:
+                    walk(value, previous[key], f"{path}.{key}" if path else key)
+            return
+        if not isinstance(current, (int, float)) or not isinstance(previous, (int, float)) or previous <= 0:
+            return
+        name = path.rsplit(".", 1)[-1]
+        if name.endswith("_ms") and current > previous * (1 + tolerance):
+            regressions.append(f"{path}: {previous} -> {current} (+{(current / previous - 1) * 100:.1f}%)")
+        elif name == "throughput_rps" and current < previous * (1 - tolerance):
+            regressions.append(f"{path}: {previous} -> {current} (-{(1 - current / previous) * 100:.1f}%)")
+
+    walk(results.get("results", {}), baseline.get("results", {}), "")
+    return regressions
+
+
+def report_regressions(regressions: list) -> int:
+    if not regressions:
+        print("Sin regresiones respecto al baseline.")
+        return 0
+    print("REGRESIONES respecto al baseline:")
+    for line in regressions:
+        print(f"  - {line}")
+    return 1
@@ -0,0 +1,253 @@
+"""
+Prueba de carga reproducible de la API.
+
+Levanta app.main:app en el mismo proceso (transporte ASGI de httpx, sin red)
+contra un mongod local (--mongo-uri) o contra un Motor en memoria
+(mongomock-motor), siembra usuarios y productos y ejecuta una mezcla de
+escenarios con N clientes concurrentes durante un tiempo fijo.
+
+    python -m benchmarks.load --products 20000 --duration 30 --out bench.json
+    python -m benchmarks.load --baseline bench.json   # falla si hay regresiones
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+
+from benchmarks.common import (
+    BENCH_PASSWORD, CATEGORIES, TAGS, compare_with_baseline, environment_info, random_product,
+    report_regressions, save_results, summarize,
+)
+
+API = "/api/v1"
+DEFAULT_MIX = "login=5,browse=35,search=10,detail=35,create=8,update=7"
+SAMPLED_IDS = 10_000 # Ids de producto que se guardan para los escenarios de detalle/actualización
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API")
+    parser.add_argument("--mongo-uri", help="mongod real; por defecto se usa un Motor en memoria")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos de carga")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="pesos por escenario, ej. browse=50,detail=50")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="guardar resultados en este JSON")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="regresión relativa permitida")
+    return parser.parse_args(argv)
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Escenario desconocido: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def start_app(args, stack: AsyncExitStack):
+    if args.mongo_uri:
+        os.environ["MONGO_URI"] = args.mongo_uri
+    from app.main import app, lifespan
+    import app.dependencies as global_deps
+    from app.config import settings
+
+    if args.mongo_uri:
+        if "bench" not in settings.MONGO_DB_NAME:
+            raise SystemExit("Con --mongo-uri la base (MONGO_DB_NAME) debe contener 'bench': se vacía al sembrar")
+        await stack.enter_async_context(lifespan(app))
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("Instala benchmarks/requirements.txt o usa --mongo-uri")
+        from app.indexes import ensure_indexes
+        client = AsyncMongoMockClient()
+        global_deps.mongo_client = client
+        global_deps.database_instance = client[settings.MONGO_DB_NAME]
+        await ensure_indexes(global_deps.database_instance)
+    return app, global_deps.database_instance
+
+
+async def seed(db, args, rng: random.Random) -> dict:
+    from app.security import get_password_hash
+
+    await db.users.delete_many({})
+    await db.products.delete_many({})
+    hashed = get_password_hash(BENCH_PASSWORD) # Un solo hash para todos: sembrar no mide bcrypt
+    users = [
+        {"email": f"user{i}@agrored-bench.co", "full_name": f"Usuario {i}", "hashed_password": hashed,
+         "is_active": True, "is_superuser": i == 0}
+        for i in range(args.users)
+    ]
+    if users:
+        await db.users.insert_many(users)
+
+    product_ids = []
+    batch = []
+    seeded_at = datetime.now(timezone.utc)
+    for i in range(args.products):
+        # Campos que la API mantiene: visitas con cola larga para que sort=popular tenga un orden realista
+        batch.append({**random_product(rng, i), "views": int(rng.paretovariate(1.2)) - 1, "updated_at": seeded_at})
+        if len(batch) == 1000 or i == args.products - 1:
+            result = await db.products.insert_many(batch)
+            product_ids.extend(str(_id) for _id in result.inserted_ids)
+            batch = []
+    if len(product_ids) > SAMPLED_IDS:
+        product_ids = rng.sample(product_ids, SAMPLED_IDS)
+    return {"emails": [user["email"] for user in users], "product_ids": product_ids}
+
+
+# --- Escenarios: cada uno hace una o más peticiones y devuelve el último status ---
+
+async def scenario_login(client, ctx, rng):
+    email = rng.choice(ctx["emails"])
+    response = await client.post(f"{API}/auth/login", data={"username": email, "password": BENCH_PASSWORD})
+    return response.status_code
+
+
+async def scenario_browse(client, ctx, rng):
+    params = {"limit": 20}
+    if rng.random() < 0.5:
+        params["category"] = rng.choice(CATEGORIES)
+    if rng.random() < 0.3:
+        params["sort"] = rng.choice(["price", "-price", "name", "popular"])
+    response = await client.get(f"{API}/products/", params=params)
+    # A veces se sigue a la página siguiente, como un usuario que hace scroll
+    if response.status_code == 200 and rng.random() < 0.3:
+        next_cursor = response.json().get("next_cursor")
+        if next_cursor:
+            response = await client.get(f"{API}/products/", params={**params, "cursor": next_cursor})
+    return response.status_code
+
+
+async def scenario_search(client, ctx, rng):
+    params = {"limit": 20, "tags": rng.choice(TAGS), "min_price": 1000, "max_price": 100000, "in_stock": "true"}
+    response = await client.get(f"{API}/products/", params=params)
+    return response.status_code
+
+
+async def scenario_detail(client, ctx, rng):
+    product_id = rng.choice(ctx["product_ids"])
+    response = await client.get(f"{API}/products/{product_id}")
+    return response.status_code
+
+
+async def scenario_create(client, ctx, rng):
+    payload = random_product(rng, rng.randint(10_000_000, 99_999_999))
+    response = await client.post(f"{API}/products/", json=payload, headers=ctx["auth"])
+    if response.status_code == 201:
+        ctx["product_ids"].append(response.json()["_id"])
+    return response.status_code
+
+
+async def scenario_update(client, ctx, rng):
+    product_id = rng.choice(ctx["product_ids"])
+    payload = {"price": round(rng.uniform(500, 200000), 2), "stock": rng.randint(0, 500)}
+    response = await client.put(f"{API}/products/{product_id}", json=payload, headers=ctx["auth"])
+    return response.status_code
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "browse": scenario_browse,
+    "search": scenario_search,
+    "detail": scenario_detail,
+    "create": scenario_create,
+    "update": scenario_update,
+}
+
+
+async def worker(client, ctx, mix: dict, deadline: float, rng: random.Random, samples: dict, errors: dict):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            status_code = await SCENARIOS[name](client, ctx, rng)
+        except Exception:
+            status_code = 599
+        samples[name].append(time.perf_counter() - start)
+        if status_code >= 400:
+            errors[name] = errors.get(name, 0) + 1
+
+
+async def run(args) -> dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    async with AsyncExitStack() as stack:
+        app, db = await start_app(args, stack)
+        print(f"Sembrando {args.users} usuarios y {args.products} productos...")
+        ctx = await seed(db, args, rng)
+
+        transport = httpx.ASGITransport(app=app)
+        client = await stack.enter_async_context(
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+        )
+        login = await client.post(
+            f"{API}/auth/login", data={"username": ctx["emails"][0], "password": BENCH_PASSWORD}
+        )
+        login.raise_for_status()
+        ctx["auth"] = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        samples = {name: [] for name in mix}
+        errors = {}
+        print(f"Carga: {args.concurrency} clientes durante {args.duration}s, mezcla {mix}")
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*[
+            worker(client, ctx, mix, deadline, random.Random(args.seed + i + 1), samples, errors)
+            for i in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+
+    routes = {}
+    for name, values in samples.items():
+        routes[name] = {
+            **summarize(values),
+            "errors": errors.get(name, 0),
+            "throughput_rps": round(len(values) / elapsed, 2),
+        }
+    all_samples = [value for values in samples.values() for value in values]
+    return {
+        "meta": {**environment_info(), "args": vars(args), "backend": "mongod" if args.mongo_uri else "mongomock"},
+        "results": {
+            "routes": routes,
+            "total": {**summarize(all_samples), "throughput_rps": round(len(all_samples) / elapsed, 2)},
+        },
+    }
+
+
+def print_table(results: dict) -> None:
+    print(f"{'escenario':<10} {'n':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(results["results"]["routes"].items()) + [("TOTAL", results["results"]["total"])]
+    for name, row in rows:
+        print(
+            f"{name:<10} {row['count']:>7} {row.get('errors', 0):>5} {row['throughput_rps']:>9} "
+            f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}"
+        )
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print_table(results)
+    if args.out:
+        save_results(args.out, results)
+    if args.baseline:
+        return report_regressions(compare_with_baseline(results, args.baseline, args.tolerance))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Micro-benchmarks de las piezas que más CPU consumen por petición:
+validación de modelos, serialización de respuestas y hashing de contraseñas.
+
+    python -m benchmarks.micro --out micro.json
+    python -m benchmarks.micro --baseline micro.json
+"""
+import argparse
+import random
+import sys
+import timeit
+
+from benchmarks.common import (
+    BENCH_PASSWORD, compare_with_baseline, environment_info, random_product, report_regressions, save_results,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de modelos, serialización y hashing")
+    parser.add_argument("--repeat", type=int, default=5, help="repeticiones; se reporta la mejor")
+    parser.add_argument("--hash-rounds", type=int, default=5, help="operaciones bcrypt por repetición")
+    parser.add_argument("--out")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.20)
+    return parser.parse_args(argv)
+
+
+def best_ms(fn, number: int, repeat: int) -> float:
+    # Mejor tiempo por llamada: el menos afectado por ruido del sistema
+    return round(min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1000, 4)
+
+
+def run(args) -> dict:
+    from bson import ObjectId
+
+    from app.models import ProductCreate, ProductRead, UserRead
+    from app.security import get_password_hash, verify_password
+    from app.serialization import PRODUCT_FIELDS, json_bytes, page_public, product_public, user_public
+
+    rng = random.Random(42)
+    payload = random_product(rng, 1)
+    docs = [{"_id": ObjectId(), **random_product(rng, i)} for i in range(100)]
+    user_doc = {"_id": ObjectId(), "email": "user@agrored-bench.co", "full_name": "Bench", "hashed_password": "x",
+                "is_active": True, "is_superuser": False}
+    hashed = get_password_hash(BENCH_PASSWORD)
+
+    cases = {
+        "product_create_validate": (lambda: ProductCreate.model_validate(payload), 2000),
+        "product_read_pydantic": (lambda: ProductRead(**docs[0]).model_dump_json(by_alias=True), 2000),
+        "product_read_fast": (lambda: json_bytes(product_public(docs[0])), 2000),
+        "product_page_100_pydantic": (
+            lambda: [ProductRead(**doc).model_dump(mode="json", by_alias=True) for doc in docs], 50
+        ),
+        "product_page_100_fast": (lambda: json_bytes(page_public(docs, None, PRODUCT_FIELDS)), 50),
+        "user_read_pydantic": (lambda: UserRead(**user_doc).model_dump_json(by_alias=True), 2000),
+        "user_read_fast": (lambda: json_bytes(user_public(user_doc)), 2000),
+        "password_hash": (lambda: get_password_hash(BENCH_PASSWORD), args.hash_rounds),
+        "password_verify": (lambda: verify_password(BENCH_PASSWORD, hashed), args.hash_rounds),
+    }
+    results = {}
+    for name, (fn, number) in cases.items():
+        results[name] = {"per_call_ms": best_ms(fn, number, args.repeat)}
+        print(f"{name:<28} {results[name]['per_call_ms']:>10} ms")
+    return {"meta": {**environment_info(), "args": vars(args)}, "results": results}
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = run(args)
+    if args.out:
+        save_results(args.out, results)
+    if args.baseline:
+        return report_regressions(compare_with_baseline(results, args.baseline, args.tolerance))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())